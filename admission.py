@@ -0,0 +1,226 @@
+import asyncio
+import math
+import os
+import re
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Optional, List, Dict, Any, Deque, Tuple
+
+from starlette.responses import JSONResponse
+
+
+# Admission control. Every API request is put in a route class with its own
+# concurrency limit and a bounded wait queue, so a burst of full-table
+# fetches or model calls cannot take all the database connections and
+# worker time away from the front desk. A request that finds its class's
+# queue full is refused at once with 429; one that waits longer than the
+# class's queue timeout gets 503. Both carry Retry-After. Limits are per
+# worker process.
+#
+#   HEMASENSE_ADMISSION=off                        disable
+#   HEMASENSE_ADMISSION=heavy_read=4/8/1.5,ml=16   class=limit[/queue[/timeout]]
+
+
+@dataclass(frozen=True)
+class ClassLimit:
+    concurrency: int
+    max_queue: int
+    queue_timeout: float     # seconds
+
+
+# heavy_read holds the full-table reads (patient and report lists, dashboard
+# counts) that pages load on open, so its queue absorbs a front desk opening
+# pages together; only its concurrency protects the database.
+LIMITS = {
+    "cheap_read": ClassLimit(32, 64, 2.0),
+    "heavy_read": ClassLimit(4, 32, 5.0),
+    "write": ClassLimit(16, 64, 5.0),
+    "ml": ClassLimit(8, 32, 1.0),
+    "llm": ClassLimit(1, 2, 0.5),
+}
+
+# First match wins. Pages, static files, /health and /ready are not API
+# routes and are never queued; neither is the long-lived SSE stream.
+ROUTE_CLASSES: List[Tuple[Optional[str], "re.Pattern", Optional[str]]] = [
+    (None, re.compile(r"^/api/events$"), None),
+    (None, re.compile(r"^/api/ai/"), "llm"),
+    (None, re.compile(r"^/api/predict(/|$)"), "ml"),
+    ("GET", re.compile(r"^/api/(patients|reports|reports/pending|dashboard/stats)$"), "heavy_read"),
+    ("GET", re.compile(r"^/api/"), "cheap_read"),
+    (None, re.compile(r"^/api/"), "write"),
+]
+
+MAX_RETRY_AFTER = 30
+WAIT_SAMPLES = 1024
+
+
+def classify(method: str, path: str) -> Optional[str]:
+    for route_method, pattern, route_class in ROUTE_CLASSES:
+        if (route_method is None or route_method == method) and pattern.match(path):
+            return route_class
+    return None
+
+
+def limits_from_env(value: Optional[str] = None) -> Optional[Dict[str, ClassLimit]]:
+    """LIMITS with HEMASENSE_ADMISSION overrides applied; None when disabled"""
+    value = os.environ.get("HEMASENSE_ADMISSION", "") if value is None else value
+    if value.strip().lower() in ("off", "0", "false"):
+        return None
+    limits = dict(LIMITS)
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        name, _, spec = item.partition("=")
+        if name not in limits:
+            raise ValueError(f"Unknown route class in HEMASENSE_ADMISSION: {name}")
+        parts = spec.split("/")
+        current = limits[name]
+        limits[name] = ClassLimit(
+            int(parts[0]),
+            int(parts[1]) if len(parts) > 1 else current.max_queue,
+            float(parts[2]) if len(parts) > 2 else current.queue_timeout,
+        )
+    return limits
+
+
+class Gate:
+    """Concurrency limit with a bounded FIFO queue, for one route class on one event loop"""
+
+    def __init__(self, name: str, limit: ClassLimit):
+        self.name = name
+        self.limit = limit
+        self.active = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self.admitted = 0
+        self.rejected_queue_full = 0
+        self.rejected_timeout = 0
+        self.max_queued = 0
+        self._waits: Deque[float] = deque(maxlen=WAIT_SAMPLES)
+        self._service_ewma = 0.0
+
+    async def acquire(self) -> Optional[int]:
+        """None when admitted, otherwise the status code to reject with"""
+        if self.active < self.limit.concurrency and not self._waiters:
+            self.active += 1
+            self._admit(0.0)
+            return None
+        if len(self._waiters) >= self.limit.max_queue:
+            self.rejected_queue_full += 1
+            return 429
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self.max_queued = max(self.max_queued, len(self._waiters))
+        start = time.perf_counter()
+        try:
+            await asyncio.wait({waiter}, timeout=self.limit.queue_timeout)
+        except BaseException:
+            # Client went away while queued
+            self._abandon(waiter)
+            raise
+        if waiter.done():
+            # release() handed its slot over; active already counts us
+            self._admit(time.perf_counter() - start)
+            return None
+        self._abandon(waiter)
+        self.rejected_timeout += 1
+        return 503
+
+    def _abandon(self, waiter: asyncio.Future):
+        if waiter.done() and not waiter.cancelled():
+            self.release()      # granted just as we gave up: pass the slot on
+            return
+        waiter.cancel()
+        try:
+            self._waiters.remove(waiter)
+        except ValueError:
+            pass
+
+    def _admit(self, waited: float):
+        self.admitted += 1
+        self._waits.append(waited)
+
+    def release(self, service_seconds: Optional[float] = None):
+        if service_seconds is not None:
+            self._service_ewma = service_seconds if not self._service_ewma \
+                else 0.8 * self._service_ewma + 0.2 * service_seconds
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)     # hand the slot to the next in line
+                return
+        self.active -= 1
+
+    def retry_after(self) -> int:
+        """Seconds until the queue ahead has likely drained"""
+        backlog = (len(self._waiters) + 1) / self.limit.concurrency
+        return max(1, min(MAX_RETRY_AFTER, math.ceil(self._service_ewma * backlog)))
+
+    def snapshot(self) -> Dict[str, Any]:
+        waits = sorted(self._waits)
+        pct = lambda p: round(waits[min(len(waits) - 1, int(p * len(waits)))] * 1000, 2) if waits else None
+        return {
+            "concurrency": self.limit.concurrency,
+            "max_queue": self.limit.max_queue,
+            "queue_timeout_s": self.limit.queue_timeout,
+            "active": self.active,
+            "queued": len(self._waiters),
+            "max_queued": self.max_queued,
+            "admitted": self.admitted,
+            "rejected_queue_full": self.rejected_queue_full,
+            "rejected_timeout": self.rejected_timeout,
+            "queue_wait_ms_p50": pct(0.5),
+            "queue_wait_ms_p95": pct(0.95),
+            "service_ms_ewma": round(self._service_ewma * 1000, 2),
+        }
+
+
+class AdmissionController:
+    """One gate per route class; an empty limits dict admits everything"""
+
+    def __init__(self, limits: Optional[Dict[str, ClassLimit]]):
+        self.gates = {name: Gate(name, limit) for name, limit in (limits or {}).items()}
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.gates)
+
+    def gate_for(self, scope) -> Optional[Gate]:
+        if scope["type"] != "http":
+            return None
+        return self.gates.get(classify(scope.get("method", ""), scope["path"]))
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"enabled": self.enabled, "classes": {name: gate.snapshot() for name, gate in self.gates.items()}}
+
+
+class AdmissionMiddleware:
+    """ASGI middleware applying the per-route-class limits; add it last so it runs first"""
+
+    def __init__(self, app, controller: AdmissionController):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope, receive, send):
+        gate = self.controller.gate_for(scope)
+        if gate is None:
+            await self.app(scope, receive, send)
+            return
+
+        rejected = await gate.acquire()
+        if rejected is not None:
+            response = JSONResponse(
+                {"detail": "Server busy, please retry", "route_class": gate.name},
+                status_code=rejected,
+                headers={"Retry-After": str(gate.retry_after())}
+            )
+            await response(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            gate.release(time.perf_counter() - start)
+
+
+admission_controller = AdmissionController(limits_from_env())
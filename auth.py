@@ -0,0 +1,273 @@
+import asyncio
+import base64
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, Callable, Tuple
+
+from database.database import get_credential, get_legacy_account, save_credential, clear_legacy_password
+
+
+# Credential checks for doctors and secretaries.
+# Passwords are stored as salted PBKDF2-SHA256 hashes in the credentials
+# table, keyed by (role, normalized username). Hashing is deliberately slow,
+# so it runs on a small dedicated thread pool (hashlib releases the GIL) and
+# successful checks are remembered for a short time.
+
+HASH_ALGORITHM = "pbkdf2_sha256"
+HASH_ITERATIONS = 240_000
+SALT_BYTES = 16
+
+HASH_WORKERS = 4
+VERIFIED_CACHE_TTL = 60.0       # seconds a verified (user, password) pair is trusted
+VERIFIED_CACHE_SIZE = 1024
+
+RATE_LIMIT_ATTEMPTS = 5         # burst of attempts per username...
+RATE_LIMIT_REFILL = 12.0        # ...then one more every N seconds
+
+
+# ============ PASSWORD HASHING ============
+
+def normalize_username(username: str) -> str:
+    """Case- and whitespace-insensitive form used as the lookup key"""
+    return " ".join(username.split()).casefold()
+
+
+def _b64(raw: bytes) -> str:
+    return base64.b64encode(raw).decode("ascii").rstrip("=")
+
+
+def _unb64(text: str) -> bytes:
+    return base64.b64decode(text + "=" * (-len(text) % 4))
+
+
+def hash_password(password: str, iterations: int = HASH_ITERATIONS) -> str:
+    """Return 'pbkdf2_sha256$<iterations>$<salt>$<hash>'"""
+    salt = os.urandom(SALT_BYTES)
+    digest = hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), salt, iterations)
+    return f"{HASH_ALGORITHM}${iterations}${_b64(salt)}${_b64(digest)}"
+
+
+def verify_password(password: str, encoded: str) -> bool:
+    """Constant-time check of a password against an encoded hash"""
+    try:
+        algorithm, iterations, salt, expected = encoded.split("$")
+        if algorithm != HASH_ALGORITHM:
+            return False
+        digest = hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), _unb64(salt), int(iterations))
+        return hmac.compare_digest(digest, _unb64(expected))
+    except (ValueError, TypeError):
+        return False
+
+
+def needs_rehash(encoded: str) -> bool:
+    """True when the hash was made with weaker settings than the current ones"""
+    try:
+        algorithm, iterations, _, _ = encoded.split("$")
+        return algorithm != HASH_ALGORITHM or int(iterations) < HASH_ITERATIONS
+    except ValueError:
+        return True
+
+
+# ============ VERIFIED CACHE ============
+
+class VerifiedCache:
+    """Short-lived memory of successful logins, so repeat logins skip PBKDF2 and the DB.
+
+    Keys are HMACs of (role, username, password) under a per-process random
+    key; plaintext passwords are never kept.
+    """
+
+    def __init__(self, ttl: float = VERIFIED_CACHE_TTL, max_size: int = VERIFIED_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._key = secrets.token_bytes(32)
+        self._entries: Dict[bytes, Tuple[float, Dict[str, Any]]] = {}
+        self._lock = threading.Lock()
+
+    def _fingerprint(self, role: str, username: str, password: str) -> bytes:
+        message = f"{role}\0{username}\0{password}".encode("utf-8")
+        return hmac.new(self._key, message, hashlib.sha256).digest()
+
+    def get(self, role: str, username: str, password: str) -> Optional[Dict[str, Any]]:
+        key = self._fingerprint(role, username, password)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, user = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            return user
+
+    def put(self, role: str, username: str, password: str, user: Dict[str, Any]):
+        key = self._fingerprint(role, username, password)
+        with self._lock:
+            if len(self._entries) >= self.max_size:
+                now = time.monotonic()
+                self._entries = {k: v for k, v in self._entries.items() if v[0] >= now}
+                if len(self._entries) >= self.max_size:
+                    self._entries.pop(next(iter(self._entries)))
+            self._entries[key] = (time.monotonic() + self.ttl, user)
+
+    def invalidate(self, role: str, username: str):
+        """Forget every cached login of one account (e.g. after a password change)"""
+        with self._lock:
+            self._entries = {
+                k: v for k, v in self._entries.items()
+                if not (v[1]["role"] == role and v[1]["username"] == username)
+            }
+
+
+# ============ RATE LIMITING ============
+
+class LoginRateLimiter:
+    """Token bucket per (role, normalized username)"""
+
+    def __init__(self, attempts: int = RATE_LIMIT_ATTEMPTS, refill_seconds: float = RATE_LIMIT_REFILL):
+        self.attempts = attempts
+        self.refill_seconds = refill_seconds
+        self._buckets: Dict[Tuple[str, str], Tuple[float, float]] = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, role: str, username: str) -> Optional[float]:
+        """Take one attempt. Returns None if allowed, else seconds until the next one."""
+        now = time.monotonic()
+        key = (role, username)
+        with self._lock:
+            tokens, stamp = self._buckets.get(key, (float(self.attempts), now))
+            tokens = min(self.attempts, tokens + (now - stamp) / self.refill_seconds)
+            if tokens < 1:
+                self._buckets[key] = (tokens, now)
+                return (1 - tokens) * self.refill_seconds
+            self._buckets[key] = (tokens - 1, now)
+            if len(self._buckets) > 10_000:
+                # Drop buckets that have fully refilled; they carry no state
+                full = self.attempts * self.refill_seconds
+                self._buckets = {k: v for k, v in self._buckets.items() if now - v[1] < full}
+            return None
+
+    def reset(self, role: str, username: str):
+        with self._lock:
+            self._buckets.pop((role, username), None)
+
+
+class TooManyAttempts(Exception):
+    def __init__(self, retry_after: float):
+        super().__init__("Too many login attempts")
+        self.retry_after = retry_after
+
+
+# ============ AUTHENTICATOR ============
+
+class Authenticator:
+    """Resolves (role, username, password) to a session user dict or None"""
+
+    def __init__(self,
+                 lookup: Callable[[str, str], Optional[Dict[str, Any]]] = get_credential,
+                 legacy_lookup: Callable[[str, str], Optional[Dict[str, Any]]] = get_legacy_account,
+                 store: Callable[[str, str, int, Optional[str]], bool] = save_credential,
+                 clear_legacy: Callable[[str, int], bool] = clear_legacy_password,
+                 workers: int = HASH_WORKERS,
+                 cache: Optional[VerifiedCache] = None,
+                 limiter: Optional[LoginRateLimiter] = None):
+        self.lookup = lookup
+        self.legacy_lookup = legacy_lookup
+        self.store = store
+        self.clear_legacy = clear_legacy
+        self.cache = cache or VerifiedCache()
+        self.limiter = limiter or LoginRateLimiter()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="auth")
+
+    async def authenticate(self, role: str, username: str, password: str) -> Optional[Dict[str, Any]]:
+        """Verify credentials off the event loop. Raises TooManyAttempts when rate limited."""
+        if role not in ("doctor", "secretary"):
+            return None
+        normalized = normalize_username(username)
+        retry_after = self.limiter.acquire(role, normalized)
+        if retry_after is not None:
+            raise TooManyAttempts(retry_after)
+
+        user = self.cache.get(role, normalized, password)
+        if user is None:
+            loop = asyncio.get_running_loop()
+            user = await loop.run_in_executor(self._pool, self._verify, role, normalized, password)
+            if user is None:
+                return None
+            self.cache.put(role, normalized, password, user)
+        self.limiter.reset(role, normalized)
+        return {"user_id": user["user_id"], "name": user["name"], "role": role}
+
+    def _verify(self, role: str, username: str, password: str) -> Optional[Dict[str, Any]]:
+        """Blocking part: indexed lookup + PBKDF2 (runs on the hash pool)"""
+        credential = self.lookup(role, username)
+        if credential is None:
+            credential = self._import_legacy(role, username)
+            if credential is None:
+                # Burn comparable time so unknown usernames are not distinguishable
+                verify_password(password, _DUMMY_HASH)
+                return None
+
+        encoded = credential.get("password_hash")
+        if encoded is None:
+            # Secretaries created before passwords existed log in by name
+            # only, as they always have, until set_password() is used.
+            if role != "secretary":
+                return None
+        elif not verify_password(password, encoded):
+            return None
+        elif needs_rehash(encoded):
+            try:
+                self.store(role, username, credential["user_id"], hash_password(password))
+            except Exception as e:
+                print(f"Error upgrading password hash: {e}")
+
+        return {"user_id": credential["user_id"], "name": credential["name"],
+                "role": role, "username": username}
+
+    def _import_legacy(self, role: str, username: str) -> Optional[Dict[str, Any]]:
+        """Move an account from the old doctor/secertary columns into credentials"""
+        account = self.legacy_lookup(role, username)
+        if account is None:
+            return None
+        password_hash = hash_password(account["password"]) if account.get("password") else None
+        if self.store(role, username, account["user_id"], password_hash) and password_hash is not None:
+            # The hash is safely stored; the plaintext copy must not outlive it
+            self.clear_legacy(role, account["user_id"])
+        return {"user_id": account["user_id"], "name": account["name"], "password_hash": password_hash}
+
+    def set_password(self, role: str, username: str, user_id: int, password: str) -> bool:
+        """Hash and store a new password, dropping cached logins for the account"""
+        normalized = normalize_username(username)
+        ok = self.store(role, normalized, user_id, hash_password(password))
+        self.cache.invalidate(role, normalized)
+        return ok
+
+
+_DUMMY_HASH = hash_password("not-a-real-password", iterations=HASH_ITERATIONS)
+
+authenticator = Authenticator()
+
+
+if __name__ == "__main__":
+    import argparse
+    import getpass
+
+    parser = argparse.ArgumentParser(description="Set a HemaSense login password")
+    parser.add_argument("role", choices=["doctor", "secretary"])
+    parser.add_argument("username")
+    parser.add_argument("user_id", type=int)
+    args = parser.parse_args()
+
+    from database.database import ensure_credentials_table
+    ensure_credentials_table()
+    password = getpass.getpass("New password: ")
+    if authenticator.set_password(args.role, args.username, args.user_id, password):
+        print("✓ Password updated")
+    else:
+        print("⚠ Could not update password")
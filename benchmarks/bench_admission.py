@@ -0,0 +1,199 @@
+"""Front-desk write latency while heavy reads flood the API, with and without admission control.
+
+Secretaries register patients (POST /api/patients) at a steady pace while
+doctors' dashboards hammer GET /api/reports, retrying as soon as they are
+refused. Each phase reports write latency percentiles and how many heavy
+reads were served or shed (429 queue full, 503 queue timeout):
+
+    writes only         baseline
+    flood, admission off
+    flood, admission on
+
+By default the requests go into main.app in-process with the database
+replaced by a stand-in. It has a fixed number of connections (like MySQL's
+max_connections), and a full-table read holds one for --heavy-ms. That
+exercises the real middleware, route classes and threadpool offload
+without a MySQL server. --url targets a running server instead (logging in
+with the loadtest bench accounts); it runs a single phase, and comparing
+runs with HEMASENSE_ADMISSION=off gives the before/after.
+
+    python -m benchmarks.bench_admission --duration 10
+    python -m benchmarks.bench_admission --url http://127.0.0.1:7500 --duration 30
+"""
+import argparse
+import asyncio
+import random
+import threading
+import time
+from collections import Counter
+
+import httpx
+import numpy as np
+
+from benchmarks.loadtest import BENCH_PASSWORD, ensure_bench_accounts, synthetic_patient
+
+
+# ============ DATABASE STAND-IN ============
+
+class StandInDatabase:
+    """A bounded connection pool; queries hold a connection for a fixed time"""
+
+    def __init__(self, connections: int, heavy_seconds: float, write_seconds: float):
+        self.pool = threading.BoundedSemaphore(connections)
+        self.heavy_seconds = heavy_seconds
+        self.write_seconds = write_seconds
+        self.next_id = 0
+
+    def _query(self, seconds: float):
+        with self.pool:
+            time.sleep(seconds)
+
+    def get_all_reports(self):
+        self._query(self.heavy_seconds)
+        return []
+
+    def create_patient(self, *args):
+        self._query(self.write_seconds)
+        self.next_id += 1
+        return self.next_id
+
+
+def install_stand_in(main, db: StandInDatabase):
+    main.get_all_reports = db.get_all_reports
+    main.create_patient = db.create_patient
+    user = {"role": "doctor", "user_id": 1, "name": "bench"}
+    main.app.dependency_overrides[main.get_current_user] = lambda: user
+    main.app.dependency_overrides[main.require_doctor] = lambda: user
+
+
+# ============ WORKLOAD ============
+
+class Phase:
+    def __init__(self, args, make_client, flood: bool):
+        self.args = args
+        self.make_client = make_client
+        self.flood = flood
+        self.write_latency = []
+        self.write_errors = Counter()
+        self.heavy = Counter()
+        self.heavy_latency = []
+        self.deadline = 0.0
+
+    async def login(self, client, role: str, index: int):
+        if not self.args.url:
+            return
+        username = f"bench_doctor_{index + 1}" if role == "doctor" else f"Bench Secretary {index + 1}"
+        await client.post("/api/login", json={"username": username, "password": BENCH_PASSWORD, "role": role})
+
+    async def secretary(self, index: int):
+        rng = random.Random(index)
+        async with self.make_client() as client:
+            await self.login(client, "secretary", index)
+            while time.perf_counter() < self.deadline:
+                start = time.perf_counter()
+                try:
+                    response = await client.post("/api/patients", json=synthetic_patient(rng, 1))
+                    status = response.status_code
+                except httpx.HTTPError:
+                    status = "error"
+                if status == 200:
+                    self.write_latency.append(time.perf_counter() - start)
+                else:
+                    self.write_errors[status] += 1
+                await asyncio.sleep(rng.expovariate(1.0 / self.args.write_interval))
+
+    async def dashboard(self, index: int):
+        async with self.make_client() as client:
+            await self.login(client, "doctor", index % max(self.args.doctors, 1))
+            while time.perf_counter() < self.deadline:
+                start = time.perf_counter()
+                try:
+                    status = (await client.get("/api/reports")).status_code
+                except httpx.HTTPError:
+                    status = "error"
+                self.heavy[status] += 1
+                if status == 200:
+                    self.heavy_latency.append(time.perf_counter() - start)
+                else:
+                    # Impatient client: ignores Retry-After to keep the pressure on
+                    await asyncio.sleep(0.02)
+
+    async def run(self):
+        self.deadline = time.perf_counter() + self.args.duration
+        tasks = [self.secretary(i) for i in range(self.args.secretaries)]
+        if self.flood:
+            tasks += [self.dashboard(i) for i in range(self.args.heavy_clients)]
+        await asyncio.gather(*tasks)
+
+
+def percentiles(samples):
+    if not samples:
+        return "-", "-", "-"
+    values = np.array(samples) * 1000
+    return tuple(f"{np.percentile(values, p):.1f}" for p in (50, 95, 99))
+
+
+def report(label: str, phase: Phase):
+    p50, p95, p99 = percentiles(phase.write_latency)
+    shed = phase.heavy.get(429, 0) + phase.heavy.get(503, 0)
+    print(f"{label:<24}{len(phase.write_latency):>7}{sum(phase.write_errors.values()):>5}"
+          f"{p50:>9}{p95:>9}{p99:>9}{phase.heavy.get(200, 0):>9}{phase.heavy.get(429, 0):>7}"
+          f"{phase.heavy.get(503, 0):>7}{percentiles(phase.heavy_latency)[1]:>11}")
+    return shed
+
+
+async def run_phases(args):
+    if args.url:
+        def make_client():
+            return httpx.AsyncClient(base_url=args.url, timeout=args.timeout)
+        phase = Phase(args, make_client, flood=True)
+        await phase.run()
+        return [("flood", phase)]
+
+    import main
+    install_stand_in(main, StandInDatabase(args.db_connections, args.heavy_ms / 1000, args.write_ms / 1000))
+    transport = httpx.ASGITransport(app=main.app)
+
+    def make_client():
+        return httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=args.timeout)
+
+    gates = main.admission_controller.gates
+    phases = []
+    for label, flood, admission in (("writes only", False, True),
+                                    ("flood, admission off", True, False),
+                                    ("flood, admission on", True, True)):
+        main.admission_controller.gates = gates if admission else {}
+        phase = Phase(args, make_client, flood)
+        await phase.run()
+        phases.append((label, phase))
+    main.admission_controller.gates = gates
+    return phases
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", help="target a running server instead of in-process main.app")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per phase")
+    parser.add_argument("--secretaries", type=int, default=4)
+    parser.add_argument("--doctors", type=int, default=2, help="bench doctor accounts to log in with (--url)")
+    parser.add_argument("--heavy-clients", type=int, default=40, help="concurrent GET /api/reports loops")
+    parser.add_argument("--write-interval", type=float, default=0.05, help="mean pause between registrations (s)")
+    parser.add_argument("--db-connections", type=int, default=8, help="stand-in connection pool size")
+    parser.add_argument("--heavy-ms", type=float, default=400.0, help="stand-in full-table read time")
+    parser.add_argument("--write-ms", type=float, default=3.0, help="stand-in insert time")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    args = parser.parse_args()
+
+    if args.url:
+        ensure_bench_accounts(args.secretaries, args.doctors)
+    phases = asyncio.run(run_phases(args))
+
+    print(f"\n{'':<24}{'POST /api/patients':^29}{'GET /api/reports':^34}")
+    print(f"{'phase':<24}{'ok':>7}{'err':>5}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+          f"{'served':>9}{'429':>7}{'503':>7}{'p95 ms':>11}")
+    for label, phase in phases:
+        report(label, phase)
+
+
+if __name__ == "__main__":
+    main()
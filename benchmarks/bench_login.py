@@ -0,0 +1,82 @@
+"""Login throughput benchmark.
+
+Drives auth.Authenticator with an in-memory credential store so the numbers
+isolate hashing, the verified-session cache and event-loop behaviour from
+MySQL. Run from the project root:
+
+    python -m benchmarks.bench_login --users 50 --logins 2000 --concurrency 32
+"""
+import argparse
+import asyncio
+import time
+
+from auth import Authenticator, LoginRateLimiter, VerifiedCache, hash_password
+
+
+def build_store(users: int):
+    """Fake credentials table: 'user<N>' / 'pass<N>' for each role"""
+    store = {}
+    for i in range(users):
+        for role in ("doctor", "secretary"):
+            store[(role, f"user{i}")] = {
+                "user_id": i,
+                "name": f"User {i}",
+                "password_hash": hash_password(f"pass{i}"),
+            }
+    return store
+
+
+async def run(auth: Authenticator, users: int, logins: int, concurrency: int):
+    """Fire `logins` logins, at most `concurrency` at a time; track event-loop stalls"""
+    semaphore = asyncio.Semaphore(concurrency)
+    stalls = []
+
+    async def watchdog():
+        # Measures how late a 10ms timer fires: a blocked loop shows up here
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(0.01)
+            stalls.append(time.perf_counter() - start - 0.01)
+
+    async def one(i: int):
+        async with semaphore:
+            role = "doctor" if i % 2 else "secretary"
+            n = i % users
+            user = await auth.authenticate(role, f"USER{n} ", f"pass{n}")
+            assert user is not None and user["user_id"] == n
+
+    monitor = asyncio.create_task(watchdog())
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(logins)))
+    elapsed = time.perf_counter() - start
+    monitor.cancel()
+    return elapsed, max(stalls) if stalls else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--logins", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    store = build_store(args.users)
+    unlimited = LoginRateLimiter(attempts=10**9)
+
+    for label, ttl in (("cold (no cache)", 0.0), ("warm (verified cache)", 60.0)):
+        auth = Authenticator(
+            lookup=lambda role, username: store.get((role, username)),
+            legacy_lookup=lambda role, username: None,
+            store=lambda *a: True,
+            workers=args.workers,
+            cache=VerifiedCache(ttl=ttl),
+            limiter=unlimited,
+        )
+        elapsed, worst_stall = asyncio.run(run(auth, args.users, args.logins, args.concurrency))
+        print(f"{label:<24} {args.logins / elapsed:10.1f} logins/s   "
+              f"worst event-loop stall {worst_stall * 1000:6.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Total memory of N workers: serve.py (preload + fork) vs naive `uvicorn --workers N`.
+
+Starts each setup, waits until every worker is up and memory has settled,
+then sums RSS and PSS (proportional set size, which splits shared pages
+between the processes that map them) over the whole process tree. RSS
+counts shared copy-on-write pages once per process, so PSS is the number
+that shows the saving. Linux only (PSS comes from /proc/<pid>/smaps_rollup).
+
+    python -m benchmarks.bench_memory --workers 4
+"""
+import argparse
+import subprocess
+import sys
+import time
+
+import httpx
+import psutil
+
+
+def tree_memory(root: psutil.Process):
+    processes = [root] + root.children(recursive=True)
+    rss = pss = 0
+    for proc in processes:
+        try:
+            info = proc.memory_full_info()
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            continue
+        rss += info.rss
+        pss += getattr(info, "pss", info.rss)
+    return len(processes), rss, pss
+
+
+def wait_until_settled(proc: psutil.Process, port: int, workers: int, timeout: float):
+    """Wait for /ready, for all workers to exist, then for memory to stop growing"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/ready", timeout=1).status_code == 200:
+                break
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    else:
+        raise SystemExit("Server did not become ready in time")
+
+    last = None
+    while time.time() < deadline:
+        count, rss, _ = tree_memory(proc)
+        if count >= workers + 1 and last is not None and abs(rss - last) < 1 << 20:
+            return
+        last = rss
+        time.sleep(2)
+
+
+def measure(label: str, command, port: int, workers: int, timeout: float):
+    popen = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        root = psutil.Process(popen.pid)
+        wait_until_settled(root, port, workers, timeout)
+        count, rss, pss = tree_memory(root)
+    finally:
+        popen.terminate()
+        try:
+            popen.wait(timeout=20)
+        except subprocess.TimeoutExpired:
+            popen.kill()
+    print(f"{label:<28}{count:>6}{rss / 2**20:>12.1f}{pss / 2**20:>12.1f}")
+    return rss, pss
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--port", type=int, default=7590)
+    parser.add_argument("--timeout", type=float, default=180)
+    args = parser.parse_args()
+
+    print(f"{'setup':<28}{'procs':>6}{'RSS MiB':>12}{'PSS MiB':>12}")
+    naive = measure("uvicorn --workers (naive)",
+                    [sys.executable, "-m", "uvicorn", "main:app", "--port", str(args.port),
+                     "--workers", str(args.workers)], args.port, args.workers, args.timeout)
+    forked = measure("serve.py (preload + fork)",
+                     [sys.executable, "serve.py", "--port", str(args.port),
+                      "--workers", str(args.workers)], args.port, args.workers, args.timeout)
+    print(f"\nPSS saved by preloading: {(naive[1] - forked[1]) / 2**20:.1f} MiB "
+          f"({(1 - forked[1] / naive[1]) * 100:.0f}%)")
+
+
+if __name__ == "__main__":
+    main()
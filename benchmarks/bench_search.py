@@ -0,0 +1,103 @@
+"""Typeahead latency of the patient search index vs a linear scan.
+
+Indexes N synthetic patients (random first/last names, Egyptian-style mobile
+numbers), then times the keystroke-by-keystroke queries a secretary types:
+growing name prefixes, two-word queries, infixes and phone fragments. The
+scan baseline is what a server-side LIKE '%q%' over every row costs.
+
+    python -m benchmarks.bench_search --patients 100000
+"""
+import argparse
+import random
+import statistics
+import time
+
+from database.search import PatientSearchIndex, normalize, digits
+
+FIRST = ["Mohamed", "Ahmed", "Mahmoud", "Mostafa", "Omar", "Youssef", "Ali", "Hassan", "Khaled", "Amr",
+         "Fatma", "Mariam", "Nour", "Salma", "Aya", "Hana", "Sara", "Yasmin", "Mona", "Heba",
+         "Ibrahim", "Karim", "Tarek", "Walid", "Sherif", "Rana", "Dina", "Reem", "Laila", "Noha"]
+LAST = ["Abdelrahman", "El-Sayed", "Hussein", "Mansour", "Farouk", "Soliman", "Ramadan", "Gamal",
+        "Fathy", "Nasser", "Saleh", "Zaki", "Shawky", "Hamdy", "Naguib", "Kamel", "Attia", "Badawi",
+        "Rashad", "Fouad", "Helmy", "Morsy", "Sabry", "Taha", "Younis", "Zidan", "Lotfy", "Samir"]
+
+
+def synthetic_patients(n: int, seed: int):
+    rng = random.Random(seed)
+    for patient_id in range(1, n + 1):
+        name = f"{rng.choice(FIRST)} {rng.choice(FIRST)} {rng.choice(LAST)}"
+        phone = f"01{rng.choice('0125')}{rng.randrange(10**8):08d}"
+        yield patient_id, name, phone
+
+
+def typeahead_queries(patients, count: int, seed: int):
+    """Every prefix of some names and phones, as typed"""
+    rng = random.Random(seed)
+    queries = []
+    while len(queries) < count:
+        _, name, phone = rng.choice(patients)
+        first, middle, last = name.split()
+        kind = rng.random()
+        if kind < 0.4:
+            queries += [name[:i] for i in range(1, len(name) + 1)]
+        elif kind < 0.6:
+            queries += [f"{first} {last[:i]}" for i in range(1, len(last) + 1)]
+        elif kind < 0.75:
+            queries += [last[:i] for i in range(3, len(last) + 1)]
+        else:
+            queries += [phone[:i] for i in range(3, len(phone) + 1)] + [phone[-i:] for i in range(4, 8)]
+    return queries[:count]
+
+
+def linear_scan(rows, query: str, limit: int):
+    text = normalize(query)
+    number = digits(query)
+    matches = [pid for pid, name, phone in rows if text in name or (number and number in phone)]
+    return matches[:limit]
+
+
+def timings(label: str, fn, queries, limit: int):
+    samples = []
+    for q in queries:
+        start = time.perf_counter()
+        fn(q, limit)
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    p = lambda q: samples[min(len(samples) - 1, int(q * len(samples)))]
+    print(f"{label:<18}{len(samples):>8}{statistics.mean(samples):>10.3f}{p(0.5):>10.3f}"
+          f"{p(0.95):>10.3f}{p(0.99):>10.3f}{samples[-1]:>10.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--patients", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=5_000)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--updates", type=int, default=2_000)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    patients = list(synthetic_patients(args.patients, args.seed))
+    index = PatientSearchIndex()
+    start = time.perf_counter()
+    index.rebuild(patients)
+    print(f"Built index of {len(index)} patients in {time.perf_counter() - start:.2f}s")
+
+    rng = random.Random(args.seed)
+    start = time.perf_counter()
+    for i in range(args.updates):
+        patient_id, name, phone = rng.choice(patients)
+        index.add(patient_id, name.upper(), phone)
+        index.add(args.patients + i + 1, name, phone)
+    per_update = (time.perf_counter() - start) / (2 * args.updates) * 1000
+    print(f"Incremental add/re-index: {per_update:.3f} ms each")
+
+    queries = typeahead_queries(patients, args.queries, args.seed)
+    scan_rows = [(pid, normalize(name), digits(phone)) for pid, name, phone in patients]
+    print(f"\n{'ms per query':<18}{'n':>8}{'mean':>10}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}")
+    timings("index", index.search, queries, args.limit)
+    timings("linear scan", lambda q, limit: linear_scan(scan_rows, q, limit), queries[:200], args.limit)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Serialization cost of /api/patients and /api/reports at 10k rows.
+
+Compares the old path (dictionary-cursor rows returned as-is, so FastAPI
+walks every value with jsonable_encoder and json.dumps the result) with the
+typed path (tuple-cursor rows validated into response models and encoded
+by FastJSONResponse). Rows are synthetic and shaped like what
+mysql-connector returns, Decimal and datetime values included, so the
+numbers cover only the work after the query.
+
+    python -m benchmarks.bench_serialization --rows 10000
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+
+from database.database import PATIENT_COLUMNS, REPORT_COLUMNS
+from schemas import FastJSONResponse, patients_from_rows, reports_from_rows
+
+
+def patient_rows(n: int, rng: random.Random):
+    start = datetime(2025, 1, 1, 8)
+    for i in range(n, 0, -1):
+        total = Decimal(rng.choice([150, 250, 400, 600]))
+        paid = Decimal(rng.randrange(0, int(total) + 1, 10))
+        visit = start + timedelta(minutes=37 * i)
+        yield (i, f"Patient {i} Hassan", rng.randint(1, 90), f"010{rng.randrange(10**8):08d}",
+               total, total - paid, rng.randint(1, 5), visit, visit, "Secretary", paid)
+
+
+def report_rows(n: int, rng: random.Random):
+    start = datetime(2025, 1, 1, 8)
+    for i in range(n, 0, -1):
+        visit = start + timedelta(minutes=37 * i)
+        yield (i, i, Decimal("7.20"), Decimal("4.81"), Decimal("13.90"), Decimal("41.70"), Decimal("88.00"),
+               Decimal("29.10"), Decimal("33.20"), Decimal("251.00"), "Healthy", visit,
+               f"Patient {i} Hassan", rng.randint(1, 90), f"010{rng.randrange(10**8):08d}", visit)
+
+
+def new_path(mapper, rows):
+    return FastJSONResponse(mapper(rows)).body
+
+
+async def old_path(columns, rows):
+    """What FastAPI does with a List[Dict] return value and no response model"""
+    dicts = [dict(zip(columns, row)) for row in rows]
+    return JSONResponse(await serialize_response(response_content=dicts)).body
+
+
+def measure(fn, repeat: int):
+    fn()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        body = fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples), len(body)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=15)
+    parser.add_argument("--seed", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    cases = {
+        "/api/patients": (PATIENT_COLUMNS, list(patient_rows(args.rows, rng)), patients_from_rows),
+        "/api/reports": (REPORT_COLUMNS, list(report_rows(args.rows, rng)), reports_from_rows),
+    }
+    print(f"{args.rows} rows, median of {args.repeat} runs")
+    print(f"{'endpoint':<16}{'old ms':>10}{'new ms':>10}{'speedup':>10}{'old KiB':>10}{'new KiB':>10}")
+    for endpoint, (columns, rows, mapper) in cases.items():
+        old_ms, old_size = measure(
+            lambda: asyncio.run(old_path(columns, rows)), args.repeat)
+        new_ms, new_size = measure(lambda: new_path(mapper, rows), args.repeat)
+        print(f"{endpoint:<16}{old_ms:>10.1f}{new_ms:>10.1f}{old_ms / new_ms:>9.1f}x"
+              f"{old_size / 1024:>10.0f}{new_size / 1024:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
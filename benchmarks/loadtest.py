@@ -0,0 +1,358 @@
+"""Replay a scripted lab workday against the API and report per-endpoint latency.
+
+Secretaries register patients in bursts and take payments; doctors poll the
+pending list, run /api/predict, save the report and print it. Doctors only
+claim patients registered during the run, so real patients already pending
+in the database are left alone. CBC values are drawn from
+"AI Models NoteBook/diagnosed_cbc_data_v4.csv". By default the requests go
+straight into main.app (one in-process worker); --url targets a running
+server instead. Needs the MySQL database configured in database/database.py.
+Run from the project root:
+
+    python -m benchmarks.loadtest --seed-patients 2000 --secretaries 4 --doctors 2
+    python -m benchmarks.loadtest --patients 300 --compare benchmarks/results/<old>.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import time
+from collections import defaultdict
+from datetime import datetime
+
+import httpx
+import numpy as np
+import pandas as pd
+
+CSV_PATH = os.path.join("AI Models NoteBook", "diagnosed_cbc_data_v4.csv")
+FEATURES = ["WBC", "RBC", "HGB", "HCT", "MCV", "MCH", "MCHC", "PLT"]
+RESULTS_DIR = os.path.join("benchmarks", "results")
+BENCH_PASSWORD = "bench"
+
+FIRST_NAMES = ["Ahmed", "Mohamed", "Mahmoud", "Youssef", "Omar", "Ali", "Hassan", "Khaled",
+               "Fatma", "Aya", "Mariam", "Nour", "Salma", "Hana", "Mona", "Sara"]
+LAST_NAMES = ["Abdel-Samie", "Farouk", "Abd El-Hameed", "Anwar", "Ibrahim", "Mostafa",
+              "Saleh", "Fathy", "Hamdy", "Sayed", "Nabil", "Gamal"]
+
+
+# ============ SYNTHETIC DATA ============
+
+class CBCSampler:
+    """Draws CBC panels from the labelled CSV with a little multiplicative jitter"""
+
+    def __init__(self, path: str = CSV_PATH, jitter: float = 0.03, seed: int = 0):
+        frame = pd.read_csv(path)
+        self.values = frame[FEATURES].to_numpy(dtype=float)
+        self.labels = frame["Diagnosis"].to_numpy()
+        self.jitter = jitter
+        self.rng = np.random.default_rng(seed)
+
+    def sample(self):
+        i = self.rng.integers(len(self.values))
+        row = self.values[i] * self.rng.normal(1.0, self.jitter, len(FEATURES))
+        row = np.maximum(row, 0.0).round(2)
+        return dict(zip(FEATURES, row.tolist())), str(self.labels[i])
+
+
+def synthetic_patient(rng: random.Random, secretary_id: int):
+    return {
+        "name": f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+        "age": rng.randint(1, 90),
+        "phone": "01" + rng.choice("0125") + "".join(str(rng.randint(0, 9)) for _ in range(8)),
+        "total_payment": rng.choice([150, 200, 250, 300, 400]),
+        "secertary_id": secretary_id,
+    }
+
+
+# ============ SEEDING ============
+
+def ensure_bench_accounts(secretaries: int, doctors: int):
+    """Create bench_doctor_<i> / 'Bench Secretary <i>' rows; returns their ids"""
+    from database.database import create_connection, ensure_credentials_table
+    ensure_credentials_table()
+    conn = create_connection()
+    if conn is None:
+        raise SystemExit("Load test needs the MySQL database configured in database/database.py")
+    cursor = conn.cursor()
+    secretary_ids, doctor_ids = [], []
+    for i in range(1, secretaries + 1):
+        name = f"Bench Secretary {i}"
+        cursor.execute("SELECT secertary_id FROM secertary WHERE name = %s", (name,))
+        row = cursor.fetchone()
+        if row is None:
+            cursor.execute("INSERT INTO secertary (name) VALUES (%s)", (name,))
+            secretary_ids.append(cursor.lastrowid)
+        else:
+            secretary_ids.append(row[0])
+    for i in range(1, doctors + 1):
+        username = f"bench_doctor_{i}"
+        cursor.execute("SELECT doctor_id FROM doctor WHERE username = %s", (username,))
+        row = cursor.fetchone()
+        if row is None:
+            cursor.execute("INSERT INTO doctor (name, username, password) VALUES (%s, %s, %s)",
+                           (f"Bench Doctor {i}", username, BENCH_PASSWORD))
+            doctor_ids.append(cursor.lastrowid)
+        else:
+            doctor_ids.append(row[0])
+    conn.commit()
+    cursor.close()
+    conn.close()
+    return secretary_ids, doctor_ids
+
+
+def seed_history(count: int, secretary_ids, sampler: CBCSampler, rng: random.Random):
+    """Bulk-insert past patients, each with a finished report"""
+    from database.database import create_patient, create_report, update_payment
+    for _ in range(count):
+        patient = synthetic_patient(rng, rng.choice(secretary_ids))
+        patient_id = create_patient(**patient)
+        if not patient_id:
+            raise SystemExit("Seeding failed: could not create patient")
+        update_payment(patient_id, patient["total_payment"])
+        cbc, diagnosis = sampler.sample()
+        create_report(patient_id, *(cbc[f] for f in FEATURES), diagnosis)
+
+
+# ============ WORKDAY ============
+
+class Recorder:
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    async def call(self, client: httpx.AsyncClient, name: str, method: str, url: str, **kwargs):
+        start = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+        except httpx.HTTPError:
+            self.errors[name] += 1
+            return None
+        self.samples[name].append(time.perf_counter() - start)
+        if response.status_code >= 400:
+            self.errors[name] += 1
+            return None
+        return response
+
+    def summary(self):
+        endpoints = {}
+        for name in sorted(set(self.samples) | set(self.errors)):
+            values = np.array(self.samples.get(name, [])) * 1000
+            endpoints[name] = {
+                "count": int(values.size),
+                "errors": self.errors.get(name, 0),
+                "mean_ms": round(float(values.mean()), 2) if values.size else None,
+                "p50_ms": round(float(np.percentile(values, 50)), 2) if values.size else None,
+                "p95_ms": round(float(np.percentile(values, 95)), 2) if values.size else None,
+                "p99_ms": round(float(np.percentile(values, 99)), 2) if values.size else None,
+                "max_ms": round(float(values.max()), 2) if values.size else None,
+            }
+        return endpoints
+
+
+class Workday:
+    def __init__(self, args, make_client, secretary_ids, doctor_ids, sampler, rng):
+        self.args = args
+        self.make_client = make_client
+        self.secretary_ids = secretary_ids
+        self.doctor_ids = doctor_ids
+        self.sampler = sampler
+        self.rng = rng
+        self.rec = Recorder()
+        self.registered = 0
+        self.active_secretaries = args.secretaries
+        self.registration_done = asyncio.Event()
+        self.registered_ids = set()     # only these may be claimed; never touch real patients
+        self.claimed = set()
+
+    async def think(self):
+        if self.args.think > 0:
+            await asyncio.sleep(self.rng.expovariate(1.0 / self.args.think))
+
+    async def login(self, client, username, role):
+        for _ in range(5):
+            response = await self.rec.call(client, "POST /api/login", "POST", "/api/login",
+                                           json={"username": username, "password": BENCH_PASSWORD, "role": role})
+            if response is not None:
+                return True
+            await asyncio.sleep(1.0)
+        return False
+
+    async def secretary(self, index: int):
+        try:
+            await self._secretary(index)
+        finally:
+            self.active_secretaries -= 1
+            if self.active_secretaries == 0:
+                self.registration_done.set()
+
+    async def _secretary(self, index: int):
+        async with self.make_client() as client:
+            if not await self.login(client, f"Bench Secretary {index + 1}", "secretary"):
+                return
+            await self.rec.call(client, "GET /api/dashboard/stats", "GET", "/api/dashboard/stats")
+            while self.registered < self.args.patients:
+                # Patients arrive in bursts: a few back to back, then a pause
+                for _ in range(self.rng.randint(1, self.args.burst)):
+                    if self.registered >= self.args.patients:
+                        break
+                    self.registered += 1
+                    patient = synthetic_patient(self.rng, self.secretary_ids[index])
+                    response = await self.rec.call(client, "POST /api/patients", "POST", "/api/patients", json=patient)
+                    if response is None:
+                        continue
+                    patient_id = response.json()["patient_id"]
+                    self.registered_ids.add(patient_id)
+                    deposit = patient["total_payment"] // 2
+                    await self.rec.call(client, "POST /api/patients/{id}/payment", "POST",
+                                        f"/api/patients/{patient_id}/payment", json={"amount": deposit})
+                    if self.rng.random() < 0.5:
+                        await self.rec.call(client, "POST /api/patients/{id}/payment", "POST",
+                                            f"/api/patients/{patient_id}/payment",
+                                            json={"amount": patient["total_payment"] - deposit})
+                if self.rng.random() < 0.2:
+                    await self.rec.call(client, "GET /api/patients", "GET", "/api/patients")
+                if self.rng.random() < 0.1:
+                    await self.rec.call(client, "GET /api/dashboard/stats", "GET", "/api/dashboard/stats")
+                await self.think()
+
+    async def doctor(self, index: int):
+        async with self.make_client() as client:
+            if not await self.login(client, f"bench_doctor_{index + 1}", "doctor"):
+                return
+            await self.rec.call(client, "GET /api/dashboard/stats", "GET", "/api/dashboard/stats")
+            while True:
+                response = await self.rec.call(client, "GET /api/reports/pending", "GET", "/api/reports/pending")
+                pending = [p["patient_id"] for p in (response.json() if response is not None else [])
+                           if p["patient_id"] in self.registered_ids and p["patient_id"] not in self.claimed]
+                if not pending:
+                    if self.registration_done.is_set():
+                        return
+                    await asyncio.sleep(self.args.poll_interval)
+                    continue
+                patient_id = pending[-1]
+                self.claimed.add(patient_id)
+                await self.rec.call(client, "GET /api/patients/{id}", "GET", f"/api/patients/{patient_id}")
+                cbc, diagnosis = self.sampler.sample()
+                await self.rec.call(client, "POST /api/predict", "POST", "/api/predict", json=cbc)
+                await self.rec.call(client, "POST /api/reports", "POST", "/api/reports",
+                                    json={"patient_id": patient_id, "Diagnosis": diagnosis, **cbc})
+                # Printing: the preview page plus the data it loads
+                await self.rec.call(client, "GET /reports/print/{id}", "GET", f"/reports/print/{patient_id}")
+                await self.rec.call(client, "GET /api/patients/{id}", "GET", f"/api/patients/{patient_id}")
+                await self.rec.call(client, "GET /api/reports/patient/{id}", "GET",
+                                    f"/api/reports/patient/{patient_id}")
+                if self.rng.random() < 0.05:
+                    await self.rec.call(client, "GET /api/reports", "GET", "/api/reports")
+                await self.think()
+
+    async def run(self):
+        start = time.perf_counter()
+        await asyncio.gather(
+            *(self.secretary(i) for i in range(self.args.secretaries)),
+            *(self.doctor(i) for i in range(self.args.doctors)),
+        )
+        return time.perf_counter() - start
+
+
+# ============ REPORTING ============
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def print_table(endpoints, baseline=None):
+    header = f"{'endpoint':<36}{'count':>7}{'err':>5}{'p50':>9}{'p95':>9}{'p99':>9}"
+    if baseline:
+        header += f"{'Δp95':>10}"
+    print(header)
+    print("-" * len(header))
+    for name, stats in endpoints.items():
+        line = (f"{name:<36}{stats['count']:>7}{stats['errors']:>5}"
+                f"{stats['p50_ms'] or 0:>9.1f}{stats['p95_ms'] or 0:>9.1f}{stats['p99_ms'] or 0:>9.1f}")
+        old = (baseline or {}).get(name)
+        if old and old.get("p95_ms") and stats["p95_ms"]:
+            line += f"{(stats['p95_ms'] - old['p95_ms']) / old['p95_ms'] * 100:>+9.1f}%"
+        print(line)
+
+
+async def run_workday(args, secretary_ids, doctor_ids, sampler, rng):
+    if args.url:
+        def make_client():
+            return httpx.AsyncClient(base_url=args.url, timeout=args.timeout)
+        day = Workday(args, make_client, secretary_ids, doctor_ids, sampler, rng)
+        return day, await day.run()
+
+    import main
+    transport = httpx.ASGITransport(app=main.app)
+
+    def make_client():
+        return httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=args.timeout)
+
+    async with main.app.router.lifespan_context(main.app):
+        day = Workday(args, make_client, secretary_ids, doctor_ids, sampler, rng)
+        return day, await day.run()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", help="target a running server instead of in-process main.app")
+    parser.add_argument("--secretaries", type=int, default=4)
+    parser.add_argument("--doctors", type=int, default=2)
+    parser.add_argument("--patients", type=int, default=200, help="registrations during the workday")
+    parser.add_argument("--burst", type=int, default=5, help="max patients registered back to back")
+    parser.add_argument("--seed-patients", type=int, default=0, help="historical patients+reports to insert first")
+    parser.add_argument("--think", type=float, default=0.0, help="mean think time between actions (s)")
+    parser.add_argument("--poll-interval", type=float, default=0.5, help="doctor pending-list poll interval (s)")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="results JSON path (default: benchmarks/results/<commit>-<time>.json)")
+    parser.add_argument("--compare", help="previous results JSON to diff p95 against")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    sampler = CBCSampler(seed=args.seed)
+    secretary_ids, doctor_ids = ensure_bench_accounts(args.secretaries, args.doctors)
+    if args.seed_patients:
+        print(f"Seeding {args.seed_patients} historical patients...")
+        seed_history(args.seed_patients, secretary_ids, sampler, rng)
+
+    day, elapsed = asyncio.run(run_workday(args, secretary_ids, doctor_ids, sampler, rng))
+    endpoints = day.rec.summary()
+    total = sum(stats["count"] for stats in endpoints.values())
+
+    commit = git_commit()
+    result = {
+        "commit": commit,
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "target": args.url or "in-process main.app",
+        "config": {k: v for k, v in vars(args).items() if k not in ("output", "compare")},
+        "elapsed_s": round(elapsed, 3),
+        "requests": total,
+        "throughput_rps": round(total / elapsed, 2) if elapsed else None,
+        "endpoints": endpoints,
+    }
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["endpoints"]
+    print_table(endpoints, baseline)
+    print(f"\n{total} requests in {elapsed:.1f}s ({result['throughput_rps']} req/s)")
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{commit}-{datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(result, f, indent=2)
+    print(f"Results saved to {output}")
+
+
+if __name__ == "__main__":
+    main()
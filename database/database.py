@@ -1,41 +1,137 @@
 import mysql.connector 
 from mysql.connector import Error
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Iterator
 from datetime import date
+from decimal import Decimal
+from database import events
+from database.search import patient_index
+from database.replicas import router
 
 def create_connection():
+    """Connection to the primary: writes, and reads that must see them"""
     connection = None
     try:
-        connection = mysql.connector.connect(
-            host="127.0.0.1",
-            port='3306',
-            user="root",
-            password="0000",
-            database="lab",
-            auth_plugin='mysql_native_password' 
-        )
+        connection = router.write_connection()
         print("Connection to MySQL DB successful")
     except Error as e:
         print(f"The error '{e}' occurred")
     return connection
 
 
-# ============ PATIENT FUNCTIONS ============
+def create_read_connection():
+    """Connection for read-only queries: a replica when one is fresh enough, else the primary"""
+    connection = None
+    try:
+        connection = router.read_connection()
+    except Error as e:
+        print(f"The error '{e}' occurred")
+    return connection
+
 
-def get_all_patients() -> List[Dict[str, Any]]:
-    """Get all patients with secretary information"""
+# Column order of the tuple-cursor list queries below (mapped to response
+# models in schemas.py)
+PATIENT_COLUMNS = ("patient_id", "name", "age", "phone", "total_payment", "remaining", "secertary_id",
+                   "now_date", "last_visit_at", "secretary_name", "paid_amount")
+REPORT_COLUMNS = ("report_id", "patient_id", "WBC", "RBC", "HGB", "HCT", "MCV", "MCH", "MCHC", "PLT",
+                  "Diagnosis", "created_at", "patient_name", "age", "phone", "now_date")
+
+PATIENT_SELECT = """
+    SELECT p.patient_id, p.name, p.age, p.phone, p.total_payment, p.remaining, p.secertary_id,
+           p.now_date, p.last_visit_at,
+           s.name as secretary_name,
+           (p.total_payment - p.remaining) as paid_amount
+    FROM patients p
+    LEFT JOIN secertary s ON p.secertary_id = s.secertary_id
+"""
+
+REPORT_SELECT = """
+    SELECT r.report_id, r.patient_id, r.WBC, r.RBC, r.HGB, r.HCT, r.MCV, r.MCH, r.MCHC, r.PLT,
+           r.Diagnosis, r.created_at,
+           p.name as patient_name, p.age, p.phone, p.now_date
+    FROM report r
+    INNER JOIN patients p ON r.patient_id = p.patient_id
+"""
+
+
+def _column_exists(cursor, table: str, column: str) -> bool:
+    cursor.execute("""
+        SELECT COUNT(*) FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s
+    """, (table, column))
+    return cursor.fetchone()[0] > 0
+
+
+def _column_precision(cursor, table: str, column: str) -> int:
+    """Fractional-second digits of a TIMESTAMP/DATETIME column"""
+    cursor.execute("""
+        SELECT DATETIME_PRECISION FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s
+    """, (table, column))
+    row = cursor.fetchone()
+    return int(row[0] or 0) if row else 0
+
+
+def _index_exists(cursor, table: str, index: str) -> bool:
+    cursor.execute("""
+        SELECT COUNT(*) FROM information_schema.STATISTICS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND INDEX_NAME = %s
+    """, (table, index))
+    return cursor.fetchone()[0] > 0
+
+
+def ensure_report_history_schema() -> bool:
+    """Allow several reports per patient: timestamps, visit tracking and the history index"""
     try:
         conn = create_connection()
-        cursor = conn.cursor(dictionary=True)
-        query = """
-            SELECT p.*, 
-                   s.name as secretary_name,
-                   (p.total_payment - p.remaining) as paid_amount
-            FROM patients p 
-            LEFT JOIN secertary s ON p.secertary_id = s.secertary_id
-            ORDER BY p.patient_id DESC
-        """
-        cursor.execute(query)
+        if conn is None:
+            return False
+        cursor = conn.cursor()
+        # Pending status compares these two clocks, so they carry
+        # microseconds: a visit started in the same second a report is saved
+        # must still count as unreported.
+        if not _column_exists(cursor, "patients", "last_visit_at"):
+            cursor.execute("ALTER TABLE patients ADD COLUMN last_visit_at TIMESTAMP(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6)")
+            cursor.execute("UPDATE patients SET last_visit_at = now_date WHERE now_date IS NOT NULL")
+        elif _column_precision(cursor, "patients", "last_visit_at") < 6:
+            cursor.execute("ALTER TABLE patients MODIFY last_visit_at TIMESTAMP(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6)")
+        if not _column_exists(cursor, "report", "created_at"):
+            # Existing reports get the migration time, which is after every
+            # existing visit, so they keep counting as done.
+            cursor.execute("ALTER TABLE report ADD COLUMN created_at TIMESTAMP(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6)")
+        elif _column_precision(cursor, "report", "created_at") < 6:
+            cursor.execute("ALTER TABLE report MODIFY created_at TIMESTAMP(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6)")
+        if not _index_exists(cursor, "report", "idx_report_patient_created"):
+            cursor.execute("CREATE INDEX idx_report_patient_created ON report (patient_id, created_at)")
+
+        # A unique key on report.patient_id alone would still allow only one
+        # report per patient; the composite index above now serves its lookups.
+        cursor.execute("""
+            SELECT INDEX_NAME FROM information_schema.STATISTICS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'report' AND NON_UNIQUE = 0
+              AND INDEX_NAME <> 'PRIMARY'
+            GROUP BY INDEX_NAME
+            HAVING COUNT(*) = 1 AND MAX(COLUMN_NAME) = 'patient_id'
+        """)
+        for (index_name,) in cursor.fetchall():
+            cursor.execute(f"ALTER TABLE report DROP INDEX `{index_name}`")
+
+        conn.commit()
+        cursor.close()
+        conn.close()
+        return True
+    except Error as e:
+        print(f"Error migrating report history schema: {e}")
+        return False
+
+
+# ============ PATIENT FUNCTIONS ============
+
+def get_all_patients() -> List[tuple]:
+    """Get all patients with secretary information (rows in PATIENT_COLUMNS order)"""
+    try:
+        conn = create_read_connection()
+        cursor = conn.cursor()
+        cursor.execute(PATIENT_SELECT + " ORDER BY p.patient_id DESC")
         patients = cursor.fetchall()
         cursor.close()
         conn.close()
@@ -48,17 +144,9 @@ def get_all_patients() -> List[Dict[str, Any]]:
 def get_patient_by_id(patient_id: int) -> Optional[Dict[str, Any]]:
     """Get single patient by ID"""
     try:
-        conn = create_connection()
+        conn = create_read_connection()
         cursor = conn.cursor(dictionary=True)
-        query = """
-            SELECT p.*, 
-                   s.name as secretary_name,
-                   (p.total_payment - p.remaining) as paid_amount
-            FROM patients p 
-            LEFT JOIN secertary s ON p.secertary_id = s.secertary_id
-            WHERE p.patient_id = %s
-        """
-        cursor.execute(query, (patient_id,))
+        cursor.execute(PATIENT_SELECT + " WHERE p.patient_id = %s", (patient_id,))
         patient = cursor.fetchone()
         cursor.close()
         conn.close()
@@ -68,6 +156,53 @@ def get_patient_by_id(patient_id: int) -> Optional[Dict[str, Any]]:
         return None
 
 
+def get_patients_by_ids(patient_ids: List[int]) -> List[tuple]:
+    """Get patients (rows in PATIENT_COLUMNS order), in the order of patient_ids"""
+    if not patient_ids:
+        return []
+    try:
+        conn = create_read_connection()
+        cursor = conn.cursor()
+        placeholders = ", ".join(["%s"] * len(patient_ids))
+        cursor.execute(PATIENT_SELECT + f" WHERE p.patient_id IN ({placeholders})", tuple(patient_ids))
+        by_id = {row[0]: row for row in cursor.fetchall()}
+        cursor.close()
+        conn.close()
+        return [by_id[i] for i in patient_ids if i in by_id]
+    except Error as e:
+        print(f"Error getting patients: {e}")
+        return []
+
+
+def get_patient_search_rows() -> Optional[List[tuple]]:
+    """(patient_id, name, phone) of every patient, for the search index.
+
+    Read from the primary: a lagging replica would drop recent patients
+    from the index until the next rebuild. None when the query fails, so
+    the index keeps its current contents instead of being emptied.
+    """
+    try:
+        conn = create_connection()
+        if conn is None:
+            return None
+        cursor = conn.cursor()
+        cursor.execute("SELECT patient_id, name, phone FROM patients")
+        rows = cursor.fetchall()
+        cursor.close()
+        conn.close()
+        return rows
+    except Error as e:
+        print(f"Error loading patients for search: {e}")
+        return None
+
+
+def build_patient_index() -> int:
+    """Build the in-process patient search index; returns the number of patients indexed"""
+    patient_index.loader = get_patient_search_rows
+    patient_index.reload()
+    return len(patient_index)
+
+
 def create_patient(name: str, age: int, phone: str, total_payment: int, secertary_id: int) -> Optional[int]:
     """Create new patient and return patient_id"""
     try:
@@ -79,9 +214,23 @@ def create_patient(name: str, age: int, phone: str, total_payment: int, secertar
         """
         cursor.execute(query, (name, age, phone, total_payment, total_payment, secertary_id))
         conn.commit()
+        router.note_write()
         patient_id = cursor.lastrowid
         cursor.close()
         conn.close()
+        patient_index.add(patient_id, name, phone)
+        events.publish("patients", "patient.created", {
+            "patient": {
+                "patient_id": patient_id,
+                "name": name,
+                "age": age,
+                "phone": phone,
+                "total_payment": total_payment,
+                "remaining": total_payment,
+                "secertary_id": secertary_id
+            },
+            "stats": {"total_patients": 1, "pending_reports": 1}
+        })
         return patient_id
     except Error as e:
         print(f"Error creating patient: {e}")
@@ -111,8 +260,20 @@ def update_patient(patient_id: int, name: str, age: int, phone: str, total_payme
         """
         cursor.execute(query, (name, age, phone, total_payment, new_remaining, patient_id))
         conn.commit()
+        router.note_write()
         cursor.close()
         conn.close()
+        patient_index.add(patient_id, name, phone)
+        events.publish("patients", "patient.updated", {
+            "patient": {
+                "patient_id": patient_id,
+                "name": name,
+                "age": age,
+                "phone": phone,
+                "total_payment": total_payment,
+                "remaining": new_remaining
+            }
+        }, key=f"patient:{patient_id}")
         return True
     except Error as e:
         print(f"Error updating patient: {e}")
@@ -125,9 +286,17 @@ def delete_patient(patient_id: int) -> bool:
         conn = create_connection()
         cursor = conn.cursor()
         cursor.execute("DELETE FROM patients WHERE patient_id = %s", (patient_id,))
+        deleted = cursor.rowcount
         conn.commit()
+        router.note_write()
         cursor.close()
         conn.close()
+        patient_index.remove(patient_id)
+        if deleted:
+            events.publish("patients", "patient.deleted", {
+                "patient_id": patient_id,
+                "stats": {"total_patients": -1}
+            })
         return True
     except Error as e:
         print(f"Error deleting patient: {e}")
@@ -152,28 +321,79 @@ def update_payment(patient_id: int, payment_amount: float) -> Optional[float]:
         cursor.execute("UPDATE patients SET remaining = %s WHERE patient_id = %s", 
                       (new_remaining, patient_id))
         conn.commit()
+        router.note_write()
         cursor.close()
         conn.close()
+        events.publish("payments", "payment.added", {
+            "patient_id": patient_id,
+            "amount": payment_amount,
+            "remaining": new_remaining
+        }, key=f"payment:{patient_id}")
         return new_remaining
     except Error as e:
         print(f"Error updating payment: {e}")
         return None
 
 
-# ============ REPORT FUNCTIONS ============
+def _event_value(value):
+    """Column value shaped like the REST API returns it (floats, ISO dates)"""
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, date):
+        return value.isoformat()
+    return value
+
 
-def get_patients_without_reports() -> List[Dict[str, Any]]:
-    """Get patients who don't have reports yet"""
+def start_visit(patient_id: int, visit_payment: int = 0) -> bool:
+    """Register a returning patient's new visit, putting them back on the pending list"""
     try:
         conn = create_connection()
-        cursor = conn.cursor(dictionary=True)
+        cursor = conn.cursor()
         query = """
-            SELECT p.*, s.name as secretary_name 
-            FROM patients p 
-            LEFT JOIN secertary s ON p.secertary_id = s.secertary_id
-            LEFT JOIN report r ON p.patient_id = r.patient_id
-            WHERE r.report_id IS NULL
-            ORDER BY p.now_date DESC
+            UPDATE patients
+            SET last_visit_at = CURRENT_TIMESTAMP(6),
+                total_payment = total_payment + %s,
+                remaining = remaining + %s
+            WHERE patient_id = %s
+        """
+        cursor.execute(query, (visit_payment, visit_payment, patient_id))
+        updated = cursor.rowcount
+        conn.commit()
+        router.note_write()
+        # The event carries the full row (read back from the primary), so
+        # pages add the patient to their pending list without refetching
+        # from a replica that may not have the visit yet.
+        cursor.execute(PATIENT_SELECT + " WHERE p.patient_id = %s", (patient_id,))
+        row = cursor.fetchone()
+        cursor.close()
+        conn.close()
+        if updated:
+            patient = {column: _event_value(value) for column, value in zip(PATIENT_COLUMNS, row or ())}
+            events.publish("patients", "patient.visit", {
+                "patient": patient,
+                "patient_id": patient_id,
+                "visit_payment": visit_payment,
+                "stats": {"pending_reports": 1}
+            })
+        return bool(updated)
+    except Error as e:
+        print(f"Error starting visit: {e}")
+        return False
+
+
+# ============ REPORT FUNCTIONS ============
+
+def get_patients_without_reports() -> List[tuple]:
+    """Get patients whose latest visit has no report yet (rows in PATIENT_COLUMNS order)"""
+    try:
+        conn = create_read_connection()
+        cursor = conn.cursor()
+        query = PATIENT_SELECT + """
+            WHERE NOT EXISTS (
+                SELECT 1 FROM report r
+                WHERE r.patient_id = p.patient_id AND r.created_at >= p.last_visit_at
+            )
+            ORDER BY p.last_visit_at DESC
         """
         cursor.execute(query)
         patients = cursor.fetchall()
@@ -185,18 +405,12 @@ def get_patients_without_reports() -> List[Dict[str, Any]]:
         return []
 
 
-def get_all_reports() -> List[Dict[str, Any]]:
-    """Get all reports with patient information (Doctor only)"""
+def get_all_reports() -> List[tuple]:
+    """Get all reports with patient information (rows in REPORT_COLUMNS order)"""
     try:
-        conn = create_connection()
-        cursor = conn.cursor(dictionary=True)
-        query = """
-            SELECT r.*, p.name as patient_name, p.age, p.phone, p.now_date
-            FROM report r
-            INNER JOIN patients p ON r.patient_id = p.patient_id
-            ORDER BY r.report_id DESC
-        """
-        cursor.execute(query)
+        conn = create_read_connection()
+        cursor = conn.cursor()
+        cursor.execute(REPORT_SELECT + " ORDER BY r.report_id DESC")
         reports = cursor.fetchall()
         cursor.close()
         conn.close()
@@ -207,15 +421,14 @@ def get_all_reports() -> List[Dict[str, Any]]:
 
 
 def get_report_by_patient(patient_id: int) -> Optional[Dict[str, Any]]:
-    """Get report for specific patient"""
+    """Get the latest report for specific patient"""
     try:
-        conn = create_connection()
+        conn = create_read_connection()
         cursor = conn.cursor(dictionary=True)
-        query = """
-            SELECT r.*, p.name as patient_name, p.age, p.phone, p.now_date
-            FROM report r
-            INNER JOIN patients p ON r.patient_id = p.patient_id
+        query = REPORT_SELECT + """
             WHERE r.patient_id = %s
+            ORDER BY r.created_at DESC, r.report_id DESC
+            LIMIT 1
         """
         cursor.execute(query, (patient_id,))
         report = cursor.fetchone()
@@ -227,6 +440,28 @@ def get_report_by_patient(patient_id: int) -> Optional[Dict[str, Any]]:
         return None
 
 
+def get_patient_reports(patient_id: int) -> List[tuple]:
+    """All reports of a patient, oldest first, as
+    (report_id, created_at, WBC, RBC, HGB, HCT, MCV, MCH, MCHC, PLT, Diagnosis) tuples"""
+    try:
+        conn = create_read_connection()
+        cursor = conn.cursor()
+        query = """
+            SELECT report_id, created_at, WBC, RBC, HGB, HCT, MCV, MCH, MCHC, PLT, Diagnosis
+            FROM report
+            WHERE patient_id = %s
+            ORDER BY created_at, report_id
+        """
+        cursor.execute(query, (patient_id,))
+        reports = cursor.fetchall()
+        cursor.close()
+        conn.close()
+        return reports
+    except Error as e:
+        print(f"Error getting patient reports: {e}")
+        return []
+
+
 def create_report(patient_id: int, wbc: float, rbc: float, hgb: float, hct: float,
                  mcv: float, mch: float, mchc: float, plt: float, diagnosis: str) -> Optional[int]:
     """Create new report and return report_id"""
@@ -239,39 +474,163 @@ def create_report(patient_id: int, wbc: float, rbc: float, hgb: float, hct: floa
         """
         cursor.execute(query, (patient_id, wbc, rbc, hgb, hct, mcv, mch, mchc, plt, diagnosis))
         conn.commit()
+        router.note_write()
         report_id = cursor.lastrowid
         cursor.close()
         conn.close()
+        events.publish("reports", "report.created", {
+            "report_id": report_id,
+            "patient_id": patient_id,
+            "Diagnosis": diagnosis,
+            "stats": {"total_reports": 1, "pending_reports": -1}
+        })
         return report_id
     except Error as e:
         print(f"Error creating report: {e}")
         return None
 
 
+def iter_labelled_reports(batch_size: int = 1000) -> Iterator[List[tuple]]:
+    """Yield (WBC, RBC, HGB, HCT, MCV, MCH, MCHC, PLT, Diagnosis) rows in batches, for training"""
+    try:
+        conn = create_read_connection()
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT WBC, RBC, HGB, HCT, MCV, MCH, MCHC, PLT, Diagnosis
+            FROM report
+            WHERE Diagnosis IS NOT NULL
+            ORDER BY report_id
+        """)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield rows
+        cursor.close()
+        conn.close()
+    except Error as e:
+        print(f"Error streaming reports: {e}")
+
+
 # ============ AUTHENTICATION FUNCTIONS ============
 
-def authenticate_doctor(username: str, password: str) -> Optional[Dict[str, Any]]:
-    """Authenticate doctor login"""
+def ensure_credentials_table() -> bool:
+    """Create the credentials table (hashed passwords, normalized usernames) if missing"""
+    try:
+        conn = create_connection()
+        if conn is None:
+            return False
+        cursor = conn.cursor()
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS credentials (
+                credential_id INT AUTO_INCREMENT PRIMARY KEY,
+                role VARCHAR(16) NOT NULL,
+                username VARCHAR(100) NOT NULL,
+                user_id INT NOT NULL,
+                password_hash VARCHAR(255) NULL,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+                UNIQUE KEY uq_credentials_role_username (role, username)
+            )
+        """)
+        conn.commit()
+        cursor.close()
+        conn.close()
+        return True
+    except Error as e:
+        print(f"Error creating credentials table: {e}")
+        return False
+
+
+def get_credential(role: str, username: str) -> Optional[Dict[str, Any]]:
+    """Get credential by role and normalized username (unique index lookup)"""
     try:
         conn = create_connection()
         cursor = conn.cursor(dictionary=True)
-        query = "SELECT * FROM doctor WHERE username = %s AND password = %s"
-        cursor.execute(query, (username, password))
-        doctor = cursor.fetchone()
+        query = """
+            SELECT c.role, c.username, c.user_id, c.password_hash,
+                   COALESCE(d.name, s.name) as name
+            FROM credentials c
+            LEFT JOIN doctor d ON c.role = 'doctor' AND d.doctor_id = c.user_id
+            LEFT JOIN secertary s ON c.role = 'secretary' AND s.secertary_id = c.user_id
+            WHERE c.role = %s AND c.username = %s
+        """
+        cursor.execute(query, (role, username))
+        credential = cursor.fetchone()
         cursor.close()
         conn.close()
-        return doctor
+        return credential
     except Error as e:
-        print(f"Error authenticating doctor: {e}")
+        print(f"Error getting credential: {e}")
         return None
 
 
+def get_legacy_account(role: str, username: str) -> Optional[Dict[str, Any]]:
+    """Find a doctor/secretary that has no credentials row yet (one-time migration)"""
+    try:
+        conn = create_connection()
+        cursor = conn.cursor(dictionary=True)
+        if role == "doctor":
+            cursor.execute(
+                "SELECT doctor_id as user_id, name, password FROM doctor WHERE username = %s",
+                (username,)
+            )
+        else:
+            cursor.execute(
+                "SELECT secertary_id as user_id, name, NULL as password FROM secertary WHERE name = %s",
+                (username,)
+            )
+        account = cursor.fetchone()
+        cursor.close()
+        conn.close()
+        return account
+    except Error as e:
+        print(f"Error getting legacy account: {e}")
+        return None
+
+
+def clear_legacy_password(role: str, user_id: int) -> bool:
+    """Drop the plaintext doctor.password once the account has a credentials row"""
+    if role != "doctor":
+        return True
+    try:
+        conn = create_connection()
+        cursor = conn.cursor()
+        cursor.execute("UPDATE doctor SET password = NULL WHERE doctor_id = %s", (user_id,))
+        conn.commit()
+        cursor.close()
+        conn.close()
+        return True
+    except Error as e:
+        print(f"Error clearing legacy password: {e}")
+        return False
+
+
+def save_credential(role: str, username: str, user_id: int, password_hash: Optional[str]) -> bool:
+    """Insert or replace the credential for a normalized username"""
+    try:
+        conn = create_connection()
+        cursor = conn.cursor()
+        query = """
+            INSERT INTO credentials (role, username, user_id, password_hash)
+            VALUES (%s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE user_id = VALUES(user_id), password_hash = VALUES(password_hash)
+        """
+        cursor.execute(query, (role, username, user_id, password_hash))
+        conn.commit()
+        cursor.close()
+        conn.close()
+        return True
+    except Error as e:
+        print(f"Error saving credential: {e}")
+        return False
+
+
 # ============ SECRETARY FUNCTIONS ============
 
 def get_all_secretaries() -> List[Dict[str, Any]]:
     """Get all secretaries"""
     try:
-        conn = create_connection()
+        conn = create_read_connection()
         cursor = conn.cursor(dictionary=True)
         cursor.execute("SELECT * FROM secertary ORDER BY secertary_id")
         secretaries = cursor.fetchall()
@@ -286,7 +645,7 @@ def get_all_secretaries() -> List[Dict[str, Any]]:
 def get_secretary_by_id(secretary_id: int) -> Optional[Dict[str, Any]]:
     """Get secretary by ID"""
     try:
-        conn = create_connection()
+        conn = create_read_connection()
         cursor = conn.cursor(dictionary=True)
         cursor.execute("SELECT * FROM secertary WHERE secertary_id = %s", (secretary_id,))
         secretary = cursor.fetchone()
@@ -303,7 +662,7 @@ def get_secretary_by_id(secretary_id: int) -> Optional[Dict[str, Any]]:
 def get_dashboard_stats() -> Dict[str, int]:
     """Get statistics for dashboard"""
     try:
-        conn = create_connection()
+        conn = create_read_connection()
         cursor = conn.cursor()
         
         cursor.execute("SELECT COUNT(*) FROM patients")
@@ -314,8 +673,10 @@ def get_dashboard_stats() -> Dict[str, int]:
         
         cursor.execute("""
             SELECT COUNT(*) FROM patients p 
-            LEFT JOIN report r ON p.patient_id = r.patient_id 
-            WHERE r.report_id IS NULL
+            WHERE NOT EXISTS (
+                SELECT 1 FROM report r
+                WHERE r.patient_id = p.patient_id AND r.created_at >= p.last_visit_at
+            )
         """)
         pending_reports = cursor.fetchone()[0]
         
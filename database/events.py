@@ -0,0 +1,183 @@
+import asyncio
+import json
+import os
+import secrets
+import threading
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Optional, List, Dict, Any, Iterable, Deque
+
+
+# In-process event bus fed by the write paths in database.py and drained by
+# the /api/events Server-Sent Events endpoint. Each worker process has its
+# own bus, so a page only sees the writes handled by the worker it is
+# connected to. Event ids are "<boot>-<n>": the boot token is new in every
+# process (forked workers included), so a Last-Event-ID issued by another
+# worker or before a restart is recognised as foreign and answered with a
+# resync instead of a wrong replay.
+
+HISTORY_SIZE = 1024        # events kept for Last-Event-ID resume
+MAX_PENDING = 256          # per-client backlog before we force a resync
+HEARTBEAT_SECONDS = 15.0   # keep-alive comment interval on idle streams
+
+TOPICS = ("patients", "reports", "payments")
+
+
+@dataclass
+class Event:
+    id: int
+    topic: str
+    type: str
+    data: Dict[str, Any]
+    key: Optional[str] = None
+    boot: str = ""
+
+    def to_sse(self) -> str:
+        """Encode the event in text/event-stream format"""
+        payload = json.dumps(self.data, default=str, separators=(",", ":"))
+        return f"id: {self.boot}-{self.id}\nevent: {self.type}\ndata: {payload}\n\n"
+
+
+@dataclass
+class Subscriber:
+    topics: frozenset
+    loop: asyncio.AbstractEventLoop
+    max_pending: int = MAX_PENDING
+    pending: "OrderedDict[Any, Event]" = field(default_factory=OrderedDict)
+    ready: asyncio.Event = field(default_factory=asyncio.Event)
+    overflowed: bool = False
+
+    def offer(self, event: Event):
+        """Queue an event, coalescing on its key. Caller holds the bus lock."""
+        if self.overflowed or event.topic not in self.topics:
+            return
+        # Keyed events (e.g. the latest balance of one patient) replace any
+        # undelivered event with the same key; unkeyed events are unique.
+        slot = event.key if event.key is not None else ("id", event.id)
+        self.pending.pop(slot, None)
+        if len(self.pending) >= self.max_pending:
+            # Slow client: drop its backlog and tell it to refetch instead
+            # of letting memory grow without bound.
+            self.pending.clear()
+            self.overflowed = True
+        else:
+            self.pending[slot] = event
+        self._wake()
+
+    def _wake(self):
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self.loop:
+            self.ready.set()
+        elif not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self.ready.set)
+
+
+class EventBus:
+    """Fan-out of data-change events to subscribed pages"""
+
+    def __init__(self, history_size: int = HISTORY_SIZE, max_pending: int = MAX_PENDING):
+        self._lock = threading.Lock()
+        self._history: Deque[Event] = deque(maxlen=history_size)
+        self._subscribers: List[Subscriber] = []
+        self._last_id = 0
+        self.max_pending = max_pending
+        self.boot = secrets.token_hex(4)
+
+    def reset_after_fork(self):
+        """Start a fresh bus in a forked child: new boot token, no history"""
+        self._lock = threading.Lock()
+        self._history.clear()
+        self._subscribers = []
+        self._last_id = 0
+        self.boot = secrets.token_hex(4)
+
+    @property
+    def last_id(self) -> str:
+        return self.format_id(self._last_id)
+
+    def format_id(self, seq: int) -> str:
+        return f"{self.boot}-{seq}"
+
+    def parse_id(self, event_id: str) -> Optional[int]:
+        """Sequence number of an id issued by this process, else None"""
+        boot, _, seq = (event_id or "").rpartition("-")
+        if boot != self.boot or not seq.isdigit():
+            return None
+        return int(seq)
+
+    def publish(self, topic: str, type: str, data: Dict[str, Any], key: Optional[str] = None) -> Event:
+        """Record an event and hand it to every matching subscriber (thread-safe)"""
+        with self._lock:
+            self._last_id += 1
+            event = Event(self._last_id, topic, type, data, key, self.boot)
+            self._history.append(event)
+            for sub in self._subscribers:
+                sub.offer(event)
+        return event
+
+    def subscribe(self, topics: Iterable[str], last_event_id: Optional[str] = None) -> Subscriber:
+        """Register a subscriber, replaying history after last_event_id if possible"""
+        sub = Subscriber(frozenset(topics), asyncio.get_running_loop(), self.max_pending)
+        with self._lock:
+            if last_event_id is not None:
+                seq = self.parse_id(last_event_id)
+                oldest = self._history[0].id if self._history else self._last_id + 1
+                if seq is None or seq > self._last_id or seq < oldest - 1:
+                    # Id from another worker or an earlier run, or history
+                    # already rotated past it: the client must refetch.
+                    sub.overflowed = True
+                    sub.ready.set()
+                else:
+                    for event in self._history:
+                        if event.id > seq:
+                            sub.offer(event)
+            self._subscribers.append(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscriber):
+        with self._lock:
+            if sub in self._subscribers:
+                self._subscribers.remove(sub)
+
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return len(self._subscribers)
+
+    async def next_batch(self, sub: Subscriber, timeout: float = HEARTBEAT_SECONDS) -> Optional[List[Event]]:
+        """Wait for pending events. Returns [] on timeout, None if a resync is needed."""
+        try:
+            await asyncio.wait_for(sub.ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            return []
+        with self._lock:
+            sub.ready.clear()
+            if sub.overflowed:
+                sub.overflowed = False
+                sub.pending.clear()
+                return None
+            batch = list(sub.pending.values())
+            sub.pending.clear()
+        return batch
+
+    def resync_message(self) -> str:
+        """SSE frame telling the client to reload its state from the REST API"""
+        return f"id: {self.last_id}\nevent: resync\ndata: {{}}\n\n"
+
+
+event_bus = EventBus()
+
+# serve.py imports this module in the parent and forks: every worker needs
+# its own boot token, or their ids would look interchangeable again.
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=event_bus.reset_after_fork)
+
+
+def publish(topic: str, type: str, data: Dict[str, Any], key: Optional[str] = None):
+    """Publish on the process-wide bus without ever failing the write path"""
+    try:
+        event_bus.publish(topic, type, data, key)
+    except Exception as e:
+        print(f"Error publishing event {type}: {e}")
@@ -0,0 +1,266 @@
+import contextvars
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional, List, Dict, Any, Tuple, Callable
+
+import mysql.connector
+from mysql.connector import Error
+
+
+# Read/write splitting. Writes, and reads that must see them, use the
+# primary; read-only queries go round-robin to the replicas in
+# HEMASENSE_DB_REPLICAS. A replica is skipped while it is unreachable or
+# further behind its source than MAX_LAG_SECONDS, and reads fall back to the
+# primary when no replica qualifies. After a request writes, its session
+# keeps reading from the primary for STICKY_SECONDS so the user always sees
+# their own changes.
+#
+#   HEMASENSE_DB_PRIMARY=127.0.0.1:3306
+#   HEMASENSE_DB_REPLICAS=10.0.0.2:3306,10.0.0.3:3306
+#   HEMASENSE_DB_MAX_LAG=5           seconds
+#   HEMASENSE_DB_STICKY=10           seconds
+#   HEMASENSE_DB_LAG_CHECK=off       trust replicas that report no
+#                                    replication status (local stand-ins)
+
+DB_USER = "root"
+DB_PASSWORD = "0000"
+DB_NAME = "lab"
+
+DEFAULT_PRIMARY = "127.0.0.1:3306"
+MAX_LAG_SECONDS = float(os.environ.get("HEMASENSE_DB_MAX_LAG", 5))
+STICKY_SECONDS = float(os.environ.get("HEMASENSE_DB_STICKY", 10))
+LAG_CHECK_SECONDS = 2.0     # how long a replica's measured lag is trusted
+DOWN_SECONDS = 10.0         # how long an unreachable replica is skipped
+SESSION_KEY = "db_primary_until"
+PRIMARY_HEADER = b"x-read-primary"     # set by pages refetching after a live-update event
+
+
+def parse_hosts(value: str) -> List[Tuple[str, int]]:
+    """'host:port,host' -> [(host, port), ...]"""
+    hosts = []
+    for item in (value or "").split(","):
+        item = item.strip()
+        if not item:
+            continue
+        host, _, port = item.rpartition(":") if ":" in item else (item, "", "3306")
+        hosts.append((host, int(port)))
+    return hosts
+
+
+def connect(host: str, port: int):
+    return mysql.connector.connect(
+        host=host,
+        port=port,
+        user=DB_USER,
+        password=DB_PASSWORD,
+        database=DB_NAME,
+        auth_plugin='mysql_native_password'
+    )
+
+
+def replica_lag(conn) -> Optional[float]:
+    """Seconds the server is behind its source; None if it is not replicating"""
+    cursor = conn.cursor(dictionary=True)
+    try:
+        try:
+            cursor.execute("SHOW REPLICA STATUS")
+        except Error:
+            cursor.execute("SHOW SLAVE STATUS")     # MySQL < 8.0.22
+        row = cursor.fetchone()
+    finally:
+        cursor.close()
+    if not row:
+        return None
+    lag = row.get("Seconds_Behind_Source", row.get("Seconds_Behind_Master"))
+    return None if lag is None else float(lag)
+
+
+@dataclass
+class RequestRouting:
+    """Per-request routing state, shared with the middleware through a context variable"""
+    primary_until: float = 0.0
+    wrote: bool = False
+
+
+_routing: contextvars.ContextVar[Optional[RequestRouting]] = contextvars.ContextVar("db_routing", default=None)
+
+
+@dataclass
+class Replica:
+    host: str
+    port: int
+    lag: Optional[float] = None
+    checked_at: float = 0.0
+    down_until: float = 0.0
+    reads: int = 0
+    error: Optional[str] = None
+
+    @property
+    def name(self) -> str:
+        return f"{self.host}:{self.port}"
+
+
+class ReplicaRouter:
+    """Chooses the server for each new connection"""
+
+    def __init__(self, primary: Tuple[str, int], replicas: List[Tuple[str, int]],
+                 connect: Callable = connect, lag_probe: Optional[Callable] = replica_lag,
+                 max_lag: float = MAX_LAG_SECONDS, sticky_seconds: float = STICKY_SECONDS):
+        self.primary = primary
+        self.replicas = [Replica(host, port) for host, port in replicas]
+        self._connect = connect
+        self.lag_probe = lag_probe      # None trusts every reachable replica
+        self.max_lag = max_lag
+        self.sticky_seconds = sticky_seconds
+        self._lock = threading.Lock()
+        self._next = 0
+        self.counters = {"primary_writes": 0, "replica_reads": 0, "primary_reads_sticky": 0,
+                         "primary_reads_fallback": 0, "replica_skipped_lag": 0, "replica_skipped_down": 0}
+
+    @classmethod
+    def from_env(cls) -> "ReplicaRouter":
+        primary = parse_hosts(os.environ.get("HEMASENSE_DB_PRIMARY", DEFAULT_PRIMARY))[0]
+        replicas = parse_hosts(os.environ.get("HEMASENSE_DB_REPLICAS", ""))
+        check = os.environ.get("HEMASENSE_DB_LAG_CHECK", "on").lower() not in ("off", "0", "false")
+        return cls(primary, replicas, lag_probe=replica_lag if check else None)
+
+    def _count(self, name: str):
+        with self._lock:
+            self.counters[name] += 1
+
+    # ---- connections ----
+
+    def write_connection(self):
+        """Connection to the primary (raises mysql.connector.Error on failure)"""
+        self._count("primary_writes")
+        return self._connect(*self.primary)
+
+    def read_connection(self):
+        """Connection for a read-only query: a fresh enough replica, else the primary"""
+        routing = _routing.get()
+        if routing is not None and routing.primary_until > time.time():
+            self._count("primary_reads_sticky")
+            return self._connect(*self.primary)
+        for replica in self._rotation():
+            conn = self._try_replica(replica)
+            if conn is not None:
+                return conn
+        if self.replicas:
+            self._count("primary_reads_fallback")
+        return self._connect(*self.primary)
+
+    def _rotation(self) -> List[Replica]:
+        with self._lock:
+            start = self._next
+            self._next = (self._next + 1) % max(len(self.replicas), 1)
+        return self.replicas[start:] + self.replicas[:start]
+
+    def _try_replica(self, replica: Replica):
+        now = time.time()
+        if replica.down_until > now:
+            self._count("replica_skipped_down")
+            return None
+        if self._too_far_behind(replica) and now - replica.checked_at < LAG_CHECK_SECONDS:
+            self._count("replica_skipped_lag")
+            return None
+        try:
+            conn = self._connect(replica.host, replica.port)
+        except Error as e:
+            replica.down_until = now + DOWN_SECONDS
+            replica.error = str(e)
+            self._count("replica_skipped_down")
+            return None
+        if self.lag_probe is not None and now - replica.checked_at >= LAG_CHECK_SECONDS:
+            # Measured on the connection we are about to use, at most every
+            # LAG_CHECK_SECONDS per replica
+            try:
+                replica.lag = self.lag_probe(conn)
+                replica.error = None
+            except Error as e:
+                replica.lag, replica.error = None, str(e)
+            replica.checked_at = now
+        if self._too_far_behind(replica):
+            conn.close()
+            self._count("replica_skipped_lag")
+            return None
+        replica.reads += 1
+        self._count("replica_reads")
+        return conn
+
+    def _too_far_behind(self, replica: Replica) -> bool:
+        if self.lag_probe is None:
+            return False
+        # Never measured yet counts as fresh; a failed or stopped
+        # replication thread (lag None after a check) does not.
+        if replica.checked_at == 0.0:
+            return False
+        return replica.lag is None or replica.lag > self.max_lag
+
+    # ---- read-your-writes ----
+
+    def note_write(self):
+        """Called after a commit: keep this request's session on the primary for a while"""
+        routing = _routing.get()
+        if routing is not None:
+            routing.primary_until = time.time() + self.sticky_seconds
+            routing.wrote = True
+
+    def snapshot(self) -> Dict[str, Any]:
+        now = time.time()
+        return {
+            "primary": f"{self.primary[0]}:{self.primary[1]}",
+            "max_lag_seconds": self.max_lag,
+            "sticky_seconds": self.sticky_seconds,
+            "replicas": [{
+                "replica": r.name,
+                "lag_seconds": r.lag,
+                "checked_s_ago": round(now - r.checked_at, 1) if r.checked_at else None,
+                "down": r.down_until > now,
+                "reads": r.reads,
+                "error": r.error,
+            } for r in self.replicas],
+            "counters": dict(self.counters),
+        }
+
+
+class ReadYourWritesMiddleware:
+    """ASGI middleware carrying the primary-stickiness deadline in the session.
+
+    A request with an X-Read-Primary header also reads from the primary.
+
+    Must run inside ServerSessionMiddleware (add it to the app first), so
+    scope["session"] exists and the updated deadline is saved with the
+    response.
+    """
+
+    def __init__(self, app, session_key: str = SESSION_KEY):
+        self.app = app
+        self.session_key = session_key
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        session = scope.get("session")
+        routing = RequestRouting(primary_until=float((session or {}).get(self.session_key, 0.0)))
+        if any(name == PRIMARY_HEADER for name, _ in scope.get("headers", ())):
+            # An event announced a write this session did not make; a replica
+            # may not have it yet. Applies to this request only.
+            routing.primary_until = float("inf")
+        token = _routing.set(routing)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and routing.wrote and session:
+                session[self.session_key] = routing.primary_until
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _routing.reset(token)
+
+
+router = ReplicaRouter.from_env()
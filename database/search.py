@@ -0,0 +1,293 @@
+import heapq
+import threading
+import time
+import unicodedata
+from bisect import bisect_left, insort
+from typing import Optional, List, Dict, Tuple, Iterable, Iterator, Set
+
+
+# In-process patient search index over name and phone, for the typeahead on
+# the patients page. Kept in sync by the write paths in database.py; each
+# worker process has its own copy, and writes handled by other workers are
+# picked up by a periodic background rebuild.
+#
+#   names    sorted (normalized full name, id)   "name starts with"
+#   tokens   sorted (name word, id)              "a word starts with"
+#   phones   sorted (phone digits, id)           "phone starts with"
+#   trigrams trigram -> ids, names and phones    "contains", 3+ characters
+#
+# Prefix lookups are a bisect plus a walk of at most `limit` entries, so the
+# common queries cost O(log n + limit) no matter how many patients match.
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+REFRESH_SECONDS = 60.0
+PHONE_PREFIX = "#"      # keeps phone trigrams apart from name trigrams
+
+
+def normalize(text: str) -> str:
+    """Casefold, strip accents and collapse whitespace"""
+    decomposed = unicodedata.normalize("NFKD", text or "")
+    stripped = "".join(c for c in decomposed if not unicodedata.combining(c))
+    return " ".join(stripped.casefold().split())
+
+
+def digits(text: str) -> str:
+    return "".join(c for c in text or "" if c.isdigit())
+
+
+def trigrams(text: str) -> Set[str]:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _prefix_range(entries: List[Tuple[str, int]], prefix: str) -> Iterator[Tuple[str, int]]:
+    """Entries whose key starts with prefix, in sorted order"""
+    i = bisect_left(entries, (prefix, -1))
+    while i < len(entries) and entries[i][0].startswith(prefix):
+        yield entries[i]
+        i += 1
+
+
+def _prefix_bounds(entries: List[Tuple[str, int]], prefix: str) -> Tuple[int, int]:
+    """Slice bounds of the entries whose key starts with prefix"""
+    return bisect_left(entries, (prefix, -1)), bisect_left(entries, (prefix + "\U0010ffff", -1))
+
+
+def _remove(entries: List[Tuple[str, int]], entry: Tuple[str, int]):
+    i = bisect_left(entries, entry)
+    if i < len(entries) and entries[i] == entry:
+        del entries[i]
+
+
+class PatientSearchIndex:
+    """Ranked prefix and substring search over patient names and phones"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._records: Dict[int, Tuple[str, str]] = {}   # id -> (normalized name, phone digits)
+        self._names: List[Tuple[str, int]] = []
+        self._tokens: List[Tuple[str, int]] = []
+        self._phones: List[Tuple[str, int]] = []
+        self._trigrams: Dict[str, Set[int]] = {}
+        self._built_at = 0.0
+        self._rebuilding = False
+        self._journal: Optional[List[Tuple[int, Optional[Tuple[str, str]]]]] = None
+        self.loader = None      # callable returning (patient_id, name, phone) rows, None on error
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    @property
+    def built_at(self) -> float:
+        return self._built_at
+
+    # ---- building and incremental updates ----
+
+    def reload(self) -> bool:
+        """Rebuild from self.loader without losing writes made while it reads.
+
+        Every add() and remove() between the start of the read and the swap
+        is journaled and replayed onto the new index, so a patient
+        registered (or deleted) mid-rebuild is neither lost nor revived.
+        A loader returning None (query failed) leaves the index untouched.
+        """
+        with self._lock:
+            self._journal = []
+        try:
+            rows = self.loader()
+            if rows is None:
+                # Load failed: keep serving the current index and leave
+                # built_at alone, so the next search tries again.
+                return False
+            self.rebuild(rows)
+            return True
+        finally:
+            with self._lock:
+                self._journal = None
+
+    def rebuild(self, rows: Iterable[Tuple[int, str, str]]):
+        """Replace the whole index from (patient_id, name, phone) rows"""
+        records, names, tokens, phones, grams = {}, [], [], [], {}
+        for patient_id, name, phone in rows:
+            name, phone = normalize(name), digits(phone)
+            records[patient_id] = (name, phone)
+            names.append((name, patient_id))
+            tokens.extend((token, patient_id) for token in set(name.split()))
+            if phone:
+                phones.append((phone, patient_id))
+            for gram in self._grams(name, phone):
+                grams.setdefault(gram, set()).add(patient_id)
+        names.sort()
+        tokens.sort()
+        phones.sort()
+        with self._lock:
+            self._records, self._names, self._tokens = records, names, tokens
+            self._phones, self._trigrams = phones, grams
+            self._built_at = time.time()
+            journal, self._journal = self._journal, None
+            for patient_id, record in journal or ():
+                if record is None:
+                    self._remove(patient_id)
+                else:
+                    self._add(patient_id, *record)
+
+    def add(self, patient_id: int, name: str, phone: str):
+        """Insert a patient, or re-index it if it is already present"""
+        with self._lock:
+            if self._journal is not None:
+                self._journal.append((patient_id, (name, phone)))
+            self._add(patient_id, name, phone)
+
+    def remove(self, patient_id: int):
+        with self._lock:
+            if self._journal is not None:
+                self._journal.append((patient_id, None))
+            self._remove(patient_id)
+
+    def _add(self, patient_id: int, name: str, phone: str):
+        with self._lock:
+            self._remove(patient_id)
+            name, phone = normalize(name), digits(phone)
+            self._records[patient_id] = (name, phone)
+            insort(self._names, (name, patient_id))
+            for token in set(name.split()):
+                insort(self._tokens, (token, patient_id))
+            if phone:
+                insort(self._phones, (phone, patient_id))
+            for gram in self._grams(name, phone):
+                self._trigrams.setdefault(gram, set()).add(patient_id)
+
+    def _remove(self, patient_id: int):
+        with self._lock:
+            record = self._records.pop(patient_id, None)
+            if record is None:
+                return
+            name, phone = record
+            _remove(self._names, (name, patient_id))
+            for token in set(name.split()):
+                _remove(self._tokens, (token, patient_id))
+            if phone:
+                _remove(self._phones, (phone, patient_id))
+            for gram in self._grams(name, phone):
+                ids = self._trigrams.get(gram)
+                if ids is not None:
+                    ids.discard(patient_id)
+                    if not ids:
+                        del self._trigrams[gram]
+
+    @staticmethod
+    def _grams(name: str, phone: str) -> Set[str]:
+        return trigrams(name) | {PHONE_PREFIX + gram for gram in trigrams(phone)}
+
+    def refresh_if_stale(self, max_age: float = REFRESH_SECONDS):
+        """Rebuild in the background when older than max_age (catches other workers' writes)"""
+        if self.loader is None or self._rebuilding or time.time() - self._built_at < max_age:
+            return
+        self._rebuilding = True
+
+        def run():
+            try:
+                self.reload()
+            finally:
+                self._rebuilding = False
+
+        threading.Thread(target=run, name="patient-search-rebuild", daemon=True).start()
+
+    # ---- querying ----
+
+    def search(self, query: str, limit: int = DEFAULT_LIMIT) -> List[int]:
+        """Patient ids ranked best first.
+
+        Name queries: full name starts with the query, then every query word
+        starts some word of the name, then the name contains the query.
+        Queries made of digits (and phone punctuation) search phones:
+        exact, then prefix, then contains.
+        """
+        limit = max(1, min(limit, MAX_LIMIT))
+        text = normalize(query)
+        if not text:
+            return []
+        with self._lock:
+            if not any(c.isalpha() for c in text):
+                number = digits(text)
+                return self._search_phone(number, limit) if number else []
+            return self._search_name(text, limit)
+
+    def _search_name(self, text: str, limit: int) -> List[int]:
+        results: List[int] = []
+        seen: Set[int] = set()
+
+        def take(ids: Iterable[int]) -> bool:
+            for patient_id in ids:
+                if patient_id not in seen:
+                    seen.add(patient_id)
+                    results.append(patient_id)
+                    if len(results) >= limit:
+                        return True
+            return False
+
+        # 1. Full name starts with the query
+        if take(pid for _, pid in _prefix_range(self._names, text)):
+            return results
+
+        # 2. Every query word starts a word of the name
+        words = text.split()
+        if len(words) == 1:
+            done = take(pid for _, pid in _prefix_range(self._tokens, text))
+        else:
+            # Intersect the id sets of each word's token range, narrowest
+            # first; once the candidates are few compared to a range, check
+            # them directly instead of materializing it.
+            ranges = sorted(((_prefix_bounds(self._tokens, w), w) for w in words),
+                            key=lambda r: r[0][1] - r[0][0])
+            (lo, hi), _ = ranges[0]
+            ids = {pid for _, pid in self._tokens[lo:hi]}
+            for (lo, hi), word in ranges[1:]:
+                if not ids:
+                    break
+                if hi - lo > 4 * len(ids):
+                    ids = {pid for pid in ids
+                           if any(t.startswith(word) for t in self._records[pid][0].split())}
+                else:
+                    ids &= {pid for _, pid in self._tokens[lo:hi]}
+            done = take(pid for _, pid in heapq.nsmallest(limit, ((self._records[pid][0], pid) for pid in ids - seen)))
+        if done:
+            return results
+
+        # 3. Name contains the query
+        if len(text) >= 3:
+            candidates = self._candidates(trigrams(text))
+            matches = [(self._records[pid][0], pid) for pid in candidates if text in self._records[pid][0]]
+            matches.sort()
+            take(pid for _, pid in matches)
+        return results
+
+    def _search_phone(self, number: str, limit: int) -> List[int]:
+        # Sorted order puts an exact match ahead of longer numbers
+        results: List[int] = []
+        for _, pid in _prefix_range(self._phones, number):
+            results.append(pid)
+            if len(results) >= limit:
+                return results
+        seen = set(results)
+        if len(number) >= 3 and len(results) < limit:
+            candidates = self._candidates({PHONE_PREFIX + gram for gram in trigrams(number)})
+            matches = sorted((self._records[pid][1], pid) for pid in candidates
+                             if pid not in seen and number in self._records[pid][1])
+            results.extend(pid for _, pid in matches[:limit - len(results)])
+        return results
+
+    def _candidates(self, grams: Set[str]) -> Set[int]:
+        """Ids having every trigram, intersecting the smallest posting lists first"""
+        postings = sorted((self._trigrams.get(gram, set()) for gram in grams), key=len)
+        if not postings or not postings[0]:
+            return set()
+        result = set(postings[0])
+        for ids in postings[1:]:
+            result &= ids
+            if not result:
+                break
+        return result
+
+
+patient_index = PatientSearchIndex()
@@ -0,0 +1,75 @@
+from datetime import datetime
+from typing import Optional, List, Dict, Any
+
+import numpy as np
+
+from prediction import FEATURES, UNITS
+
+
+# Longitudinal view of one patient's CBC reports. The rows come straight from
+# a tuple cursor and every statistic is computed on a (visits x analytes)
+# array at once, so a patient with hundreds of visits costs one indexed
+# query and a handful of numpy operations.
+
+SECONDS_PER_DAY = 86400.0
+
+
+def _round(array: np.ndarray, digits: int = 4) -> List[Optional[float]]:
+    """Array -> JSON list with NaN as null"""
+    rounded = np.round(array, digits)
+    return [None if np.isnan(v) else float(v) for v in rounded]
+
+
+def build_history(patient_id: int, rows: List[tuple]) -> Dict[str, Any]:
+    """rows: (report_id, created_at, WBC, ..., PLT, Diagnosis) oldest first"""
+    history = {
+        "patient_id": patient_id,
+        "visits": len(rows),
+        "report_ids": [row[0] for row in rows],
+        "dates": [row[1].isoformat() if isinstance(row[1], datetime) else row[1] for row in rows],
+        "diagnoses": [row[-1] for row in rows],
+        "analytes": {}
+    }
+    if not rows:
+        return history
+
+    values = np.array([row[2:-1] for row in rows], dtype=np.float64)   # (visits, analytes)
+    days = np.array([row[1].timestamp() if isinstance(row[1], datetime) else np.nan for row in rows])
+    days = (days - days[0]) / SECONDS_PER_DAY
+
+    # Change since the previous visit (first visit has none)
+    deltas = np.full_like(values, np.nan)
+    deltas[1:] = np.diff(values, axis=0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        pct = np.full_like(values, np.nan)
+        pct[1:] = deltas[1:] / values[:-1] * 100
+        pct[~np.isfinite(pct)] = np.nan
+
+        # Least-squares slope per analyte over time, all columns at once
+        if len(rows) > 1 and np.all(np.isfinite(days)) and np.ptp(days) > 0:
+            centered = days - days.mean()
+            slopes = centered @ (values - values.mean(axis=0)) / (centered @ centered)
+        else:
+            slopes = np.full(values.shape[1], np.nan)
+        total_change = values[-1] - values[0]
+        total_pct = np.where(values[0] != 0, total_change / values[0] * 100, np.nan)
+
+    mins, maxs, means = values.min(axis=0), values.max(axis=0), values.mean(axis=0)
+    for i, name in enumerate(FEATURES):
+        history["analytes"][name] = {
+            "unit": UNITS[name],
+            "values": _round(values[:, i]),
+            "deltas": _round(deltas[:, i]),
+            "pct_changes": _round(pct[:, i], 2),
+            "summary": {
+                "first": float(values[0, i]),
+                "latest": float(values[-1, i]),
+                "change": _round(total_change[i:i + 1])[0],
+                "pct_change": _round(total_pct[i:i + 1], 2)[0],
+                "slope_per_30_days": _round(slopes[i:i + 1] * 30)[0],
+                "min": float(mins[i]),
+                "max": float(maxs[i]),
+                "mean": _round(means[i:i + 1])[0],
+            }
+        }
+    return history
@@ -1,43 +1,76 @@
-from fastapi import FastAPI, Request, Form, HTTPException, Depends, status
+from fastapi import FastAPI, Request, Form, HTTPException, Depends, Query, status
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import JSONResponse, HTMLResponse, StreamingResponse, RedirectResponse
 from pydantic import BaseModel
 from fastapi.templating import Jinja2Templates
-from starlette.middleware.sessions import SessionMiddleware
+from starlette.concurrency import run_in_threadpool
 import os
 from datetime import datetime
+import time
 import uvicorn
 from database.database import *
+from database.events import event_bus, TOPICS, HEARTBEAT_SECONDS
+from database.replicas import router as db_router, ReadYourWritesMiddleware
+from database.search import patient_index, DEFAULT_LIMIT as SEARCH_LIMIT, MAX_LIMIT as MAX_SEARCH_LIMIT
+from auth import authenticator, TooManyAttempts
+from sessions import ServerSessionMiddleware, session_store, session_metrics
+from admission import AdmissionMiddleware, admission_controller
+from prediction import engine, FEATURES
+from monitoring import monitor
+from history import build_history
+from schemas import (FastJSONResponse, PatientOut, ReportOut, DashboardStats, PredictionOut,
+                     patients_from_rows, reports_from_rows)
 from transformers import AutoTokenizer, AutoModelForCausalLM, TextIteratorStreamer
 import torch
 import torchvision.transforms as transforms
 from threading import Thread
-from typing import Optional
+from typing import Optional, List
+from contextlib import asynccontextmanager
 import pickle
 import numpy as np
 import joblib
 
 
-app = FastAPI()
+_schema_ready = False
 
-# Add session middleware (secret key should be environment variable in production)
-app.add_middleware(SessionMiddleware, secret_key="your-secret-key-change-in-production")
+
+def migrate_schema():
+    """Create and migrate tables (serve.py runs this once, before forking)"""
+    global _schema_ready
+    ensure_credentials_table()
+    ensure_report_history_schema()
+    _schema_ready = True
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Startup/shutdown hooks"""
+    if not _schema_ready:
+        migrate_schema()
+    print(f"✓ Patient search index built ({build_patient_index()} patients)")
+    engine.warm_up()
+    yield
+
+
+app = FastAPI(lifespan=lifespan, default_response_class=FastJSONResponse)
+
+# Reads after a write stay on the primary (added first so it runs inside
+# the session middleware)
+app.add_middleware(ReadYourWritesMiddleware)
+
+# Server-side sessions: the cookie holds only an opaque session id
+app.add_middleware(ServerSessionMiddleware, store=session_store)
+
+# Per-route-class concurrency limits; outermost, so shed requests cost nothing else
+app.add_middleware(AdmissionMiddleware, controller=admission_controller)
 
 # Mount static files and templates
 app.mount("/static", StaticFiles(directory="templates"), name="static")
 templates = Jinja2Templates(directory="templates")
 
-# Load Decision Tree ML Model
-try:
-   # Reload the model from the pickle file
-    with open('DecisionTree.pkl', 'rb') as file:
-        loaded_model = pickle.load(file)
-    print("✓ Decision Tree model loaded successfully")
-    
-
-except Exception as e:
-    print(f"⚠ Warning: Could not load Decision Tree model: {e}")
-    ml_model = None
+# Load Decision Tree ML Model (the production launcher imports this module
+# in its parent process, so workers share the loaded model copy-on-write)
+engine.load()
 
 # # Load AI Model
 # model_name = "SciReason-LFM2-2.6B"
@@ -58,6 +91,11 @@ class LoginRequest(BaseModel):
     role: str  # 'doctor' or 'secretary'
 
 
+class SessionRevokeRequest(BaseModel):
+    role: str
+    user_id: int
+
+
 class PatientCreate(BaseModel):
     name: str
     age: int
@@ -73,6 +111,10 @@ class PatientUpdate(BaseModel):
     total_payment: int
 
 
+class VisitCreate(BaseModel):
+    total_payment: int = 0
+
+
 class PaymentRequest(BaseModel):
     amount: float
 
@@ -110,7 +152,7 @@ class AiDiagnosis(BaseModel):
 # ============ AUTHENTICATION HELPERS ============
 
 def get_current_user(request: Request):
-    """Get current user from session"""
+    """Get current user from session (resolved once per request by the middleware)"""
     user = request.session.get("user")
     if not user:
         raise HTTPException(status_code=401, detail="Not authenticated")
@@ -213,39 +255,58 @@ async def print_preview_page(request: Request, patient_id: int):
 @app.post("/api/login")
 async def login(request: Request, credentials: LoginRequest):
     """Login endpoint for both doctor and secretary"""
-    if credentials.role == "doctor":
-        user = authenticate_doctor(credentials.username, credentials.password)
-        if user:
-            request.session["user"] = {
-                "user_id": user["doctor_id"],
-                "name": user["name"],
-                "role": "doctor"
-            }
-            return {"success": True, "user": request.session["user"]}
-    
-    # For secretary, we'll use a simple check (you can add secretary table with credentials)
-    # For now, just check if secretary exists by name
-    elif credentials.role == "secretary":
-        secretaries = get_all_secretaries()
-        for sec in secretaries:
-            if sec["name"].lower() == credentials.username.lower():
-                request.session["user"] = {
-                    "user_id": sec["secertary_id"],
-                    "name": sec["name"],
-                    "role": "secretary"
-                }
-                return {"success": True, "user": request.session["user"]}
-    
+    try:
+        user = await authenticator.authenticate(
+            credentials.role,
+            credentials.username,
+            credentials.password
+        )
+    except TooManyAttempts as e:
+        raise HTTPException(
+            status_code=429,
+            detail="Too many login attempts, try again later",
+            headers={"Retry-After": str(max(1, round(e.retry_after)))}
+        )
+
+    if user:
+        request.session["user"] = user
+        return {"success": True, "user": request.session["user"]}
+
     raise HTTPException(status_code=401, detail="Invalid credentials")
 
 
 @app.post("/api/logout")
 async def logout(request: Request):
-    """Logout endpoint"""
+    """Logout endpoint (the middleware revokes the server-side session)"""
     request.session.clear()
     return {"success": True}
 
 
+@app.post("/api/sessions/revoke", dependencies=[Depends(require_doctor)])
+async def revoke_sessions_api(request: Request, target: SessionRevokeRequest):
+    """Log a user out everywhere - DOCTOR ONLY"""
+    revoked = session_store.revoke_user(target.role, target.user_id)
+    return {"success": True, "revoked": revoked}
+
+
+@app.get("/api/sessions/metrics", dependencies=[Depends(require_doctor)])
+async def session_metrics_api(request: Request):
+    """Active sessions and session lookup latency - DOCTOR ONLY"""
+    return {"active_sessions": session_store.active_count(), **session_metrics.snapshot()}
+
+
+@app.get("/api/db/routing", dependencies=[Depends(require_doctor)])
+async def db_routing_api(request: Request):
+    """Replica lag, health and read/write routing counters for this worker - DOCTOR ONLY"""
+    return db_router.snapshot()
+
+
+@app.get("/api/admission/metrics", dependencies=[Depends(require_doctor)])
+async def admission_metrics_api(request: Request):
+    """Concurrency, queue depth and rejections per route class for this worker - DOCTOR ONLY"""
+    return admission_controller.snapshot()
+
+
 @app.get("/api/current-user")
 async def current_user(request: Request):
     """Get current logged-in user"""
@@ -258,28 +319,32 @@ async def current_user(request: Request):
 
 # ============ PATIENT API ============
 
-@app.get("/api/patients")
+@app.get("/api/patients", response_model=List[PatientOut], dependencies=[Depends(get_current_user)])
 async def get_patients(request: Request):
     """Get all patients"""
-    get_current_user(request)  # Require authentication
-    patients = get_all_patients()
-    return patients
+    patients = await run_in_threadpool(lambda: patients_from_rows(get_all_patients()))
+    return FastJSONResponse(patients)
+
+
+@app.get("/api/patients/search", response_model=List[PatientOut], dependencies=[Depends(get_current_user)])
+async def search_patients_api(request: Request, q: str = "", limit: int = Query(SEARCH_LIMIT, ge=1, le=MAX_SEARCH_LIMIT)):
+    """Typeahead search by name or phone, best matches first"""
+    patient_index.refresh_if_stale()
+    return FastJSONResponse(patients_from_rows(get_patients_by_ids(patient_index.search(q, limit))))
 
 
-@app.get("/api/patients/{patient_id}")
+@app.get("/api/patients/{patient_id}", response_model=PatientOut, dependencies=[Depends(get_current_user)])
 async def get_patient(request: Request, patient_id: int):
     """Get single patient"""
-    get_current_user(request)
     patient = get_patient_by_id(patient_id)
     if not patient:
         raise HTTPException(status_code=404, detail="Patient not found")
-    return patient
+    return FastJSONResponse(PatientOut.model_validate(patient))
 
 
-@app.post("/api/patients")
+@app.post("/api/patients", dependencies=[Depends(get_current_user)])
 async def create_patient_api(request: Request, patient: PatientCreate):
     """Create new patient"""
-    get_current_user(request)
     patient_id = create_patient(
         patient.name,
         patient.age,
@@ -292,10 +357,9 @@ async def create_patient_api(request: Request, patient: PatientCreate):
     raise HTTPException(status_code=500, detail="Failed to create patient")
 
 
-@app.put("/api/patients/{patient_id}")
+@app.put("/api/patients/{patient_id}", dependencies=[Depends(get_current_user)])
 async def update_patient_api(request: Request, patient_id: int, patient: PatientUpdate):
     """Update patient"""
-    get_current_user(request)
     success = update_patient(
         patient_id,
         patient.name,
@@ -308,20 +372,34 @@ async def update_patient_api(request: Request, patient_id: int, patient: Patient
     raise HTTPException(status_code=500, detail="Failed to update patient")
 
 
-@app.delete("/api/patients/{patient_id}")
+@app.delete("/api/patients/{patient_id}", dependencies=[Depends(get_current_user)])
 async def delete_patient_api(request: Request, patient_id: int):
     """Delete patient"""
-    get_current_user(request)
     success = delete_patient(patient_id)
     if success:
         return {"success": True}
     raise HTTPException(status_code=500, detail="Failed to delete patient")
 
 
-@app.post("/api/patients/{patient_id}/payment")
+@app.get("/api/patients/{patient_id}/history", dependencies=[Depends(get_current_user)])
+async def get_patient_history_api(request: Request, patient_id: int):
+    """All reports of a patient as per-analyte time series with trend deltas"""
+    if not get_patient_by_id(patient_id):
+        raise HTTPException(status_code=404, detail="Patient not found")
+    return build_history(patient_id, get_patient_reports(patient_id))
+
+
+@app.post("/api/patients/{patient_id}/visits", dependencies=[Depends(get_current_user)])
+async def start_visit_api(request: Request, patient_id: int, visit: VisitCreate):
+    """Register a returning patient's new visit (puts them back on the pending list)"""
+    if start_visit(patient_id, visit.total_payment):
+        return {"success": True}
+    raise HTTPException(status_code=404, detail="Patient not found")
+
+
+@app.post("/api/patients/{patient_id}/payment", dependencies=[Depends(get_current_user)])
 async def add_payment_api(request: Request, patient_id: int, payment: PaymentRequest):
     """Add payment to patient"""
-    get_current_user(request)
     new_remaining = update_payment(patient_id, payment.amount)
     if new_remaining is not None:
         return {"success": True, "new_remaining": new_remaining}
@@ -330,36 +408,32 @@ async def add_payment_api(request: Request, patient_id: int, payment: PaymentReq
 
 # ============ REPORT API ============
 
-@app.get("/api/reports/pending")
+@app.get("/api/reports/pending", response_model=List[PatientOut], dependencies=[Depends(require_doctor)])
 async def get_pending_reports_api(request: Request):
     """Get patients without reports - DOCTOR ONLY"""
-    require_doctor(request)
-    patients = get_patients_without_reports()
-    return patients
+    patients = await run_in_threadpool(lambda: patients_from_rows(get_patients_without_reports()))
+    return FastJSONResponse(patients)
 
 
-@app.get("/api/reports")
+@app.get("/api/reports", response_model=List[ReportOut], dependencies=[Depends(require_doctor)])
 async def get_all_reports_api(request: Request):
     """Get all reports - DOCTOR ONLY"""
-    require_doctor(request)
-    reports = get_all_reports()
-    return reports
+    reports = await run_in_threadpool(lambda: reports_from_rows(get_all_reports()))
+    return FastJSONResponse(reports)
 
 
-@app.get("/api/reports/patient/{patient_id}")
+@app.get("/api/reports/patient/{patient_id}", response_model=ReportOut, dependencies=[Depends(get_current_user)])
 async def get_patient_report_api(request: Request, patient_id: int):
     """Get report for specific patient"""
-    get_current_user(request)
     report = get_report_by_patient(patient_id)
     if not report:
         raise HTTPException(status_code=404, detail="Report not found")
-    return report
+    return FastJSONResponse(ReportOut.model_validate(report))
 
 
-@app.post("/api/reports")
+@app.post("/api/reports", dependencies=[Depends(require_doctor)])
 async def create_report_api(request: Request, report: ReportCreate):
     """Create new report - DOCTOR ONLY"""
-    require_doctor(request)
     report_id = create_report(
         report.patient_id,
         report.WBC,
@@ -373,108 +447,162 @@ async def create_report_api(request: Request, report: ReportCreate):
         report.Diagnosis
     )
     if report_id:
+        # Every saved report is a labelled point: compare the model with the doctor
+        model_diagnosis = engine.predict([getattr(report, name) for name in FEATURES])["diagnosis"]
+        monitor.observe_report(model_diagnosis, report.Diagnosis)
         return {"success": True, "report_id": report_id}
     raise HTTPException(status_code=500, detail="Failed to create report")
 
 
 # ============ SECRETARY API ============
 
-@app.get("/api/secretaries")
+@app.get("/api/secretaries", dependencies=[Depends(get_current_user)])
 async def get_secretaries_api(request: Request):
     """Get all secretaries"""
-    get_current_user(request)
     secretaries = get_all_secretaries()
     return secretaries
 
 
 # ============ DASHBOARD API ============
 
-@app.get("/api/dashboard/stats")
+@app.get("/api/dashboard/stats", response_model=DashboardStats, dependencies=[Depends(get_current_user)])
 async def get_dashboard_stats_api(request: Request):
     """Get dashboard statistics"""
-    get_current_user(request)
     stats = get_dashboard_stats()
-    return stats
+    return FastJSONResponse(stats)
+
+
+# ============ LIVE UPDATES (SSE) ============
+
+@app.get("/api/events")
+async def events_stream(request: Request, topics: Optional[str] = None, last_event_id: Optional[str] = None,
+                        user: dict = Depends(get_current_user)):
+    """Server-Sent Events stream of patient/report/payment changes"""
+    wanted = set(topics.split(",")) if topics else set(TOPICS)
+    if user.get("role") != "doctor":
+        wanted.discard("reports")
+    wanted &= set(TOPICS)
+    if not wanted:
+        raise HTTPException(status_code=400, detail="No valid topics requested")
+
+    # EventSource resends the last id it saw in this header on reconnect
+    header_id = request.headers.get("last-event-id")
+    if header_id:
+        last_event_id = header_id
+
+    # A fresh stream starts at the newest id. A resumed one keeps the id it
+    # resumed from until the replayed events arrive, so a drop before the
+    # replay is written does not skip them on the next reconnect. Ids this
+    # worker did not issue get a resync, which carries the current id.
+    resumable = last_event_id is not None and event_bus.parse_id(last_event_id) is not None
+    ready_id = last_event_id if resumable else event_bus.last_id
+    sub = event_bus.subscribe(wanted, last_event_id)
+
+    async def stream():
+        try:
+            yield f"retry: 3000\nid: {ready_id}\nevent: ready\ndata: {{}}\n\n"
+            while not await request.is_disconnected():
+                batch = await event_bus.next_batch(sub, HEARTBEAT_SECONDS)
+                if batch is None:
+                    yield event_bus.resync_message()
+                elif not batch:
+                    yield ": keep-alive\n\n"
+                else:
+                    yield "".join(event.to_sse() for event in batch)
+        finally:
+            event_bus.unsubscribe(sub)
+
+    return StreamingResponse(stream(), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    })
 
 
 # ============ ML PREDICTION API ============
-from sklearn.preprocessing import StandardScaler
 
-@app.post("/api/predict")
+MAX_BATCH_PREDICTIONS = 1000
+
+
+async def reload_model_if_due():
+    """Pick up a newly promoted model; hashing and unpickling run off the event loop"""
+    if engine.reload_due:
+        await run_in_threadpool(engine.maybe_reload)
+
+
+@app.post("/api/predict", response_model=PredictionOut, dependencies=[Depends(require_doctor)])
 async def predict_diagnosis(request: Request, cbc_data: CBCData):
     """Predict diagnosis from CBC values using ML model - DOCTOR ONLY"""
-    require_doctor(request)
-    scaler = joblib.load("scaler.pkl")
-    diagnosis_map = {
-        0 : 'Healthy',
-        1 : 'Other microcytic anemia',
-        2 : 'Iron deficiency anemia',
-        3 : 'Normocytic hypochromic anemia',
-        4 : 'Normocytic normochromic anemia',
-        5 : 'Macrocytic anemia',
-        6 : 'Thrombocytopenia',
-        7: 'Leukemia',
-        8 : 'Leukemia with thrombocytopenia'
-    }
-    # cbc['Diagnosis'] = cbc['Diagnosis'].map(diagnosis_map)
-    # Check if model is loaded
-    if loaded_model is None:
-        # Fallback to rule-based prediction if model is not loaded
-        diagnosis = "Normal"
-        confidence = 0.85
-        
-        if cbc_data.HGB < 13.5:
-            diagnosis = "Anemia Detected"
-            confidence = 0.92
-        elif cbc_data.WBC > 11.0:
-            diagnosis = "Elevated WBC - Further Investigation Needed"
-            confidence = 0.88
-        elif cbc_data.PLT < 150:
-            diagnosis = "Low Platelet Count"
-            confidence = 0.90
-    else:
-        # Use trained Decision Tree model
-        try:
-            # Prepare features in the correct order for the model
-            # [WBC, RBC, HGB, HCT, MCV, MCH, MCHC, PLT]
-            features = np.array([[
-                cbc_data.WBC,
-                cbc_data.RBC,
-                cbc_data.HGB,
-                cbc_data.HCT,
-                cbc_data.MCV,
-                cbc_data.MCH,
-                cbc_data.MCHC,
-                cbc_data.PLT
-            ]])
-            features = scaler.transform(features)
-
-            print(features)
-            # Get prediction
-            prediction = loaded_model.predict(features)[0]
-            prediction = diagnosis_map.get(int(prediction), "Unknown")
-
-            # Get probability/confidence if available
-            if hasattr(loaded_model, 'predict_proba'):
-                probabilities = loaded_model.predict_proba(features)[0]
-                print(prediction)
-
-                confidence = float(max(probabilities))
-            else:
-                confidence = 0.85  # Default confidence for models without probability
-            
-            # Map prediction to diagnosis string
-            diagnosis = str(prediction)
-            
-        except Exception as e:
-            print(f"Error during prediction: {e}")
-            diagnosis = "Error in prediction"
-            confidence = 0.0
-    
+    await reload_model_if_due()
+    values = [getattr(cbc_data, name) for name in FEATURES]
+    start = time.perf_counter()
+    result = engine.predict(values)
+    monitor.observe_predictions([values], [result["diagnosis"]], time.perf_counter() - start)
+    return FastJSONResponse(result)
+
+
+@app.post("/api/predict/batch", response_model=List[PredictionOut], dependencies=[Depends(require_doctor)])
+async def predict_diagnosis_batch(request: Request, panels: List[CBCData]):
+    """Predict many CBC panels in one call - DOCTOR ONLY"""
+    if len(panels) > MAX_BATCH_PREDICTIONS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_PREDICTIONS} panels per request")
+    await reload_model_if_due()
+    rows = [[getattr(panel, name) for name in FEATURES] for panel in panels]
+    start = time.perf_counter()
+    results = engine.predict_batch(rows)
+    if rows:
+        monitor.observe_predictions(rows, [r["diagnosis"] for r in results], time.perf_counter() - start)
+    return FastJSONResponse(results)
+
+
+@app.get("/api/metrics/model", dependencies=[Depends(require_doctor)])
+async def model_metrics_api(request: Request):
+    """Input drift, prediction mix, doctor agreement and throughput for this worker - DOCTOR ONLY"""
+    return {"worker": os.environ.get("HEMASENSE_WORKER_ID", "0"), "model_version": engine.version,
+            **monitor.snapshot()}
+
+
+@app.get("/api/models/current", dependencies=[Depends(require_doctor)])
+async def current_model_api(request: Request):
+    """Model version served by this worker - DOCTOR ONLY"""
+    return {"version": engine.version, "loaded_at": engine.loaded_at}
+
+
+@app.post("/api/models/reload", dependencies=[Depends(require_doctor)])
+async def reload_model_api(request: Request):
+    """Load the promoted model version now instead of at the next periodic check - DOCTOR ONLY"""
+    if not await run_in_threadpool(engine.load):
+        raise HTTPException(status_code=500, detail="Failed to load model")
+    return {"success": True, "version": engine.version}
+
+
+# ============ HEALTH ============
+
+STARTED_AT = time.time()
+
+
+@app.get("/health")
+async def health():
+    """Liveness of this worker process"""
     return {
-        "diagnosis": diagnosis,
-        "confidence": confidence
+        "status": "ok",
+        "pid": os.getpid(),
+        "worker": os.environ.get("HEMASENSE_WORKER_ID", "0"),
+        "uptime_s": round(time.time() - STARTED_AT, 1)
+    }
+
+
+@app.get("/ready")
+async def ready():
+    """Readiness: model loaded and warmed up in this worker"""
+    body = {
+        "ready": engine.ready,
+        "pid": os.getpid(),
+        "worker": os.environ.get("HEMASENSE_WORKER_ID", "0"),
+        "model_loaded": engine.model is not None
     }
+    if not engine.ready:
+        return JSONResponse(status_code=503, content=body)
+    return body
 
 
 
@@ -0,0 +1,220 @@
+import os
+import threading
+import time
+from typing import Optional, List, Dict, Any, Sequence
+
+import numpy as np
+import pandas as pd
+
+from prediction import FEATURES, DIAGNOSIS_MAP
+
+
+# Online monitoring of the live CBC stream: feature histograms and running
+# moments per analyte, the class mix of predictions, model-vs-doctor
+# agreement on saved reports and prediction throughput. Everything is kept
+# in a fixed ring of time buckets (fixed-edge histograms, so memory does not
+# grow with traffic) and compared against the training distribution from the
+# notebook CSV. State is per worker process.
+
+REFERENCE_CSV = os.path.join("AI Models NoteBook", "diagnosed_cbc_data_v4.csv")
+HISTOGRAM_BINS = 10             # quantile bins of the training data per analyte
+BUCKET_SECONDS = 300            # ring of 5-minute buckets...
+BUCKET_COUNT = 288              # ...covering 24 hours
+WINDOWS = {"15m": 15 * 60, "1h": 60 * 60, "24h": 24 * 60 * 60}
+PSI_EPSILON = 1e-4
+
+CLASSES = [DIAGNOSIS_MAP[i] for i in sorted(DIAGNOSIS_MAP)]
+OTHER_CLASS = len(CLASSES)      # rule-based / error / unknown diagnoses
+
+
+def psi(expected: np.ndarray, actual: np.ndarray) -> float:
+    """Population stability index between two proportion vectors"""
+    p = np.clip(expected, PSI_EPSILON, None)
+    q = np.clip(actual, PSI_EPSILON, None)
+    return float(np.sum((q - p) * np.log(q / p)))
+
+
+def drift_status(score: float) -> str:
+    # Conventional PSI reading
+    if score < 0.1:
+        return "stable"
+    if score < 0.25:
+        return "moderate"
+    return "significant"
+
+
+class Reference:
+    """Training distribution: histogram edges and proportions per analyte, class mix"""
+
+    def __init__(self, values: np.ndarray, labels: Sequence[str], bins: int = HISTOGRAM_BINS):
+        quantiles = np.linspace(0, 1, bins + 1)[1:-1]
+        # Interior edges only: the first and last bins are open-ended, so
+        # every live value lands in some bin.
+        self.edges = [np.unique(np.quantile(values[:, f], quantiles)) for f in range(len(FEATURES))]
+        self.n_bins = max(len(e) for e in self.edges) + 1
+        self.histograms = np.zeros((len(FEATURES), self.n_bins))
+        for f, edges in enumerate(self.edges):
+            counts = np.bincount(np.searchsorted(edges, values[:, f], side="right"), minlength=self.n_bins)
+            self.histograms[f] = counts / counts.sum()
+        self.means = values.mean(axis=0)
+        self.stds = values.std(axis=0)
+        classes = np.array([_class_index(label) for label in labels])
+        counts = np.bincount(classes, minlength=len(CLASSES) + 1)
+        self.classes = counts / counts.sum()
+
+    @classmethod
+    def from_csv(cls, path: str = REFERENCE_CSV) -> Optional["Reference"]:
+        try:
+            frame = pd.read_csv(path, usecols=FEATURES + ["Diagnosis"]).dropna()
+        except Exception as e:
+            print(f"⚠ Warning: Could not load drift reference: {e}")
+            return None
+        return cls(frame[FEATURES].to_numpy(dtype=np.float64), frame["Diagnosis"].tolist())
+
+    def bin_index(self, values: np.ndarray) -> np.ndarray:
+        """(rows, features) raw values -> (rows, features) histogram bin ids"""
+        return np.stack([np.searchsorted(edges, values[:, f], side="right")
+                         for f, edges in enumerate(self.edges)], axis=1)
+
+
+_CLASS_INDEX = {name.casefold(): i for i, name in enumerate(CLASSES)}
+
+
+def _class_index(diagnosis: str) -> int:
+    return _CLASS_INDEX.get(diagnosis.strip().casefold(), OTHER_CLASS)
+
+
+class DriftMonitor:
+    """Fixed-size, time-bucketed statistics of predictions and saved reports"""
+
+    def __init__(self, reference: Optional[Reference], bucket_seconds: int = BUCKET_SECONDS,
+                 bucket_count: int = BUCKET_COUNT):
+        self.reference = reference
+        self.bucket_seconds = bucket_seconds
+        self.bucket_count = bucket_count
+        n_features = len(FEATURES)
+        n_bins = reference.n_bins if reference else 1
+        n_classes = len(CLASSES) + 1
+        self._lock = threading.Lock()
+        self._epoch = np.full(bucket_count, -1, dtype=np.int64)
+        # Live inputs seen by /api/predict
+        self._hist = np.zeros((bucket_count, n_features, n_bins), dtype=np.int64)
+        self._n = np.zeros(bucket_count, dtype=np.int64)
+        self._sum = np.zeros((bucket_count, n_features))
+        self._sumsq = np.zeros((bucket_count, n_features))
+        self._classes = np.zeros((bucket_count, n_classes), dtype=np.int64)
+        self._latency = np.zeros(bucket_count)
+        # Saved reports: model vs doctor
+        self._reports = np.zeros(bucket_count, dtype=np.int64)
+        self._agree = np.zeros(bucket_count, dtype=np.int64)
+        self._doctor_classes = np.zeros((bucket_count, n_classes), dtype=np.int64)
+        self.started_at = time.time()
+
+    # ---- recording ----
+
+    def _bucket(self, now: float) -> int:
+        """Ring slot for `now`, cleared if it still holds an older period. Caller holds the lock."""
+        epoch = int(now // self.bucket_seconds)
+        slot = epoch % self.bucket_count
+        if self._epoch[slot] != epoch:
+            self._epoch[slot] = epoch
+            for array in (self._hist, self._n, self._sum, self._sumsq, self._classes,
+                          self._latency, self._reports, self._agree, self._doctor_classes):
+                array[slot] = 0
+        return slot
+
+    def observe_predictions(self, rows: Sequence[Sequence[float]], diagnoses: Sequence[str],
+                            seconds: float = 0.0, now: Optional[float] = None):
+        """Record the inputs and outputs of one /api/predict (or batch) call"""
+        values = np.asarray(rows, dtype=np.float64)
+        classes = np.bincount([_class_index(d) for d in diagnoses], minlength=self._classes.shape[1])
+        bins = self.reference.bin_index(values) if self.reference else None
+        with self._lock:
+            slot = self._bucket(now if now is not None else time.time())
+            self._n[slot] += len(values)
+            self._sum[slot] += values.sum(axis=0)
+            self._sumsq[slot] += (values * values).sum(axis=0)
+            self._classes[slot] += classes
+            self._latency[slot] += seconds
+            if bins is not None:
+                for f in range(len(FEATURES)):
+                    self._hist[slot, f] += np.bincount(bins[:, f], minlength=self._hist.shape[2])
+
+    def observe_report(self, model_diagnosis: str, doctor_diagnosis: str, now: Optional[float] = None):
+        """Record a saved report: what the model says for its values vs what the doctor wrote"""
+        doctor = _class_index(doctor_diagnosis)
+        with self._lock:
+            slot = self._bucket(now if now is not None else time.time())
+            self._reports[slot] += 1
+            self._doctor_classes[slot, doctor] += 1
+            if model_diagnosis.casefold() == doctor_diagnosis.strip().casefold():
+                self._agree[slot] += 1
+
+    # ---- reading ----
+
+    def snapshot(self, now: Optional[float] = None) -> Dict[str, Any]:
+        now = now if now is not None else time.time()
+        current = int(now // self.bucket_seconds)
+        with self._lock:
+            return {
+                "bucket_seconds": self.bucket_seconds,
+                "windows": {name: self._window(now, current, seconds) for name, seconds in WINDOWS.items()}
+            }
+
+    def _window(self, now: float, current: int, seconds: int) -> Dict[str, Any]:
+        span = max(1, min(self.bucket_count, -(-seconds // self.bucket_seconds)))
+        mask = (self._epoch > current - span) & (self._epoch <= current)
+        n = int(self._n[mask].sum())
+        reports = int(self._reports[mask].sum())
+        agree = int(self._agree[mask].sum())
+        elapsed = min(seconds, now - self.started_at)
+        result = {
+            "predictions": n,
+            "predictions_per_min": round(n / max(elapsed, 1) * 60, 3),
+            "latency_ms_mean": round(float(self._latency[mask].sum()) / n * 1000, 3) if n else None,
+            "reports": reports,
+            "agreement_rate": round(agree / reports, 4) if reports else None,
+            "class_distribution": self._distribution(self._classes[mask].sum(axis=0)),
+            "doctor_class_distribution": self._distribution(self._doctor_classes[mask].sum(axis=0)),
+            "features": {},
+            "drift_score": None,
+            "drift_status": None,
+        }
+        if n == 0:
+            return result
+
+        sums = self._sum[mask].sum(axis=0)
+        sumsq = self._sumsq[mask].sum(axis=0)
+        means = sums / n
+        stds = np.sqrt(np.maximum(sumsq / n - means * means, 0.0))
+        hist = self._hist[mask].sum(axis=0)
+        scores = []
+        for f, name in enumerate(FEATURES):
+            stats = {"mean": round(float(means[f]), 4), "std": round(float(stds[f]), 4)}
+            if self.reference is not None:
+                score = psi(self.reference.histograms[f], hist[f] / n)
+                scores.append(score)
+                stats.update({
+                    "training_mean": round(float(self.reference.means[f]), 4),
+                    "psi": round(score, 4),
+                })
+            result["features"][name] = stats
+        if self.reference is not None:
+            class_counts = self._classes[mask].sum(axis=0)
+            result["class_psi"] = round(psi(self.reference.classes, class_counts / class_counts.sum()), 4)
+            # Overall score is the worst analyte: one shifted input is enough
+            # to make the tree's thresholds misfire.
+            result["drift_score"] = round(max(scores), 4)
+            result["drift_status"] = drift_status(result["drift_score"])
+        return result
+
+    @staticmethod
+    def _distribution(counts: np.ndarray) -> Dict[str, float]:
+        total = counts.sum()
+        if not total:
+            return {}
+        names = CLASSES + ["Other"]
+        return {names[i]: round(float(c / total), 4) for i, c in enumerate(counts) if c}
+
+
+monitor = DriftMonitor(Reference.from_csv())
@@ -0,0 +1,337 @@
+import hashlib
+import json
+import os
+import pickle
+import time
+from dataclasses import dataclass
+from typing import Optional, List, Dict, Any, Sequence
+
+import joblib
+import numpy as np
+
+
+# Decision Tree prediction engine. The model and scaler are loaded once per
+# process (or once in the launcher's parent before it forks workers) instead
+# of on every /api/predict call. When train.py has promoted a version in the
+# models/ registry, that version is served instead of the files in the
+# project root, and workers switch to newly promoted versions on their own.
+
+MODEL_PATH = "DecisionTree.pkl"
+SCALER_PATH = "scaler.pkl"
+LLM_NAME = "SciReason-LFM2-2.6B"
+
+REGISTRY_DIR = "models"
+RELOAD_CHECK_SECONDS = 30.0
+
+# Feature order the model was trained on
+FEATURES = ["WBC", "RBC", "HGB", "HCT", "MCV", "MCH", "MCHC", "PLT"]
+
+DIAGNOSIS_MAP = {
+    0: 'Healthy',
+    1: 'Other microcytic anemia',
+    2: 'Iron deficiency anemia',
+    3: 'Normocytic hypochromic anemia',
+    4: 'Normocytic normochromic anemia',
+    5: 'Macrocytic anemia',
+    6: 'Thrombocytopenia',
+    7: 'Leukemia',
+    8: 'Leukemia with thrombocytopenia'
+}
+
+UNITS = {
+    "WBC": "x10^3/µL",
+    "RBC": "x10^6/µL",
+    "HGB": "g/dL",
+    "HCT": "%",
+    "MCV": "fL",
+    "MCH": "pg",
+    "MCHC": "g/dL",
+    "PLT": "x10^3/µL"
+}
+
+# Typical healthy adult panel used to warm a worker up
+WARMUP_SAMPLE = [7.0, 4.8, 14.0, 42.0, 88.0, 29.0, 33.0, 250.0]
+
+
+# ============ MODEL REGISTRY ============
+
+def sha256_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def current_version(registry: str = REGISTRY_DIR) -> Optional[str]:
+    """Version named in <registry>/CURRENT, or None if nothing was promoted"""
+    try:
+        with open(os.path.join(registry, "CURRENT")) as file:
+            return file.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def set_current_version(version: str, registry: str = REGISTRY_DIR):
+    """Atomically point <registry>/CURRENT at a version directory"""
+    tmp = os.path.join(registry, f".CURRENT.{os.getpid()}")
+    with open(tmp, "w") as file:
+        file.write(version + "\n")
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(tmp, os.path.join(registry, "CURRENT"))
+
+
+def read_manifest(version: str, registry: str = REGISTRY_DIR) -> Dict[str, Any]:
+    with open(os.path.join(registry, version, "manifest.json")) as file:
+        return json.load(file)
+
+
+# ============ LEAF EXPLANATIONS ============
+
+def _format_value(value: float) -> str:
+    return f"{value:.4g}"
+
+
+def _describe(conditions: List[Dict[str, Any]]) -> str:
+    parts = []
+    for c in conditions:
+        unit = f" {c['unit']}" if c["unit"] != "%" else "%"
+        if c["min"] is not None and c["max"] is not None:
+            parts.append(f"{_format_value(c['min'])} < {c['feature']} ≤ {_format_value(c['max'])}{unit}")
+        elif c["max"] is not None:
+            parts.append(f"{c['feature']} ≤ {_format_value(c['max'])}{unit}")
+        else:
+            parts.append(f"{c['feature']} > {_format_value(c['min'])}{unit}")
+    return " and ".join(parts)
+
+
+def build_leaf_table(model, mean: np.ndarray, scale: np.ndarray) -> Dict[int, Dict[str, Any]]:
+    """Walk the tree once and describe every leaf in raw CBC units.
+
+    The tree splits on standardized values, so each threshold t is mapped
+    back with t * scale + mean. Conditions on the same analyte along a path
+    are merged into a single range.
+    """
+    tree = model.tree_
+    values = tree.value[:, 0, :]
+    table = {}
+    # (node, {feature index: [lower, upper]}, order features were first seen)
+    stack = [(0, {}, [])]
+    while stack:
+        node, bounds, order = stack.pop()
+        left, right = tree.children_left[node], tree.children_right[node]
+        if left == right:
+            distribution = values[node] / values[node].sum()
+            best = int(np.argmax(distribution))
+            conditions = [{
+                "feature": FEATURES[i],
+                "min": None if bounds[i][0] is None else round(bounds[i][0], 4),
+                "max": None if bounds[i][1] is None else round(bounds[i][1], 4),
+                "unit": UNITS[FEATURES[i]]
+            } for i in order]
+            table[node] = {
+                "label": int(model.classes_[best]),
+                "confidence": float(distribution[best]),
+                "explanation": {
+                    "leaf": int(node),
+                    "samples": int(tree.n_node_samples[node]),
+                    "conditions": conditions,
+                    "text": _describe(conditions)
+                }
+            }
+            continue
+        i = int(tree.feature[node])
+        raw = float(tree.threshold[node] * scale[i] + mean[i])
+        seen = order if i in bounds else order + [i]
+        lower, upper = bounds.get(i, [None, None])
+        # left: x <= threshold, right: x > threshold
+        stack.append((left, {**bounds, i: [lower, raw if upper is None else min(upper, raw)]}, seen))
+        stack.append((right, {**bounds, i: [raw if lower is None else max(lower, raw), upper]}, seen))
+    return table
+
+
+@dataclass(frozen=True)
+class LoadedModel:
+    """Everything one prediction needs, swapped in as a single reference"""
+    model: Any
+    scaler: Any
+    mean: np.ndarray
+    scale: np.ndarray
+    version: str
+    loaded_at: float
+    # Response body per leaf node id, built once at load time
+    leaves: Dict[int, Dict[str, Any]]
+
+
+class PredictionEngine:
+    """Holds the Decision Tree and scaler and turns CBC values into a diagnosis"""
+
+    def __init__(self, model_path: str = MODEL_PATH, scaler_path: str = SCALER_PATH,
+                 registry: str = REGISTRY_DIR):
+        self.model_path = model_path
+        self.scaler_path = scaler_path
+        self.registry = registry
+        self.ready = False
+        self._state: Optional[LoadedModel] = None
+        self._next_check = 0.0
+
+    @property
+    def model(self):
+        return self._state.model if self._state else None
+
+    @property
+    def scaler(self):
+        return self._state.scaler if self._state else None
+
+    @property
+    def version(self) -> Optional[str]:
+        return self._state.version if self._state else None
+
+    @property
+    def loaded_at(self) -> Optional[float]:
+        return self._state.loaded_at if self._state else None
+
+    def load(self) -> bool:
+        """Load the promoted registry version (or the root files); keeps the current model on failure"""
+        version = current_version(self.registry)
+        try:
+            if version:
+                model_path, scaler_path = self._verified_paths(version)
+            else:
+                model_path, scaler_path, version = self.model_path, self.scaler_path, "root"
+            with open(model_path, 'rb') as file:
+                model = pickle.load(file)
+            scaler = joblib.load(scaler_path)
+        except Exception as e:
+            print(f"⚠ Warning: Could not load Decision Tree model: {e}")
+            return False
+        self._install(model, scaler, version)
+        print(f"✓ Decision Tree model loaded successfully ({version})")
+        return True
+
+    def _verified_paths(self, version: str):
+        """Artifact paths of a registry version, after checking their checksums"""
+        manifest = read_manifest(version, self.registry)
+        paths = []
+        for name in ("DecisionTree.pkl", "scaler.pkl"):
+            path = os.path.join(self.registry, version, name)
+            if sha256_file(path) != manifest["artifacts"][name]["sha256"]:
+                raise ValueError(f"checksum mismatch for {path}")
+            paths.append(path)
+        return paths
+
+    @property
+    def reload_due(self) -> bool:
+        """True when maybe_reload() would look at the registry again"""
+        return time.monotonic() >= self._next_check
+
+    def maybe_reload(self) -> bool:
+        """Periodic check for a newly promoted version; reloads if there is one (blocking)"""
+        now = time.monotonic()
+        if now < self._next_check:
+            return False
+        self._next_check = now + RELOAD_CHECK_SECONDS
+        version = current_version(self.registry)
+        if version is None or version == self.version:
+            return False
+        return self.load()
+
+    def _install(self, model, scaler, version: str = "root"):
+        # StandardScaler is an affine map; applying it with numpy avoids the
+        # per-call validation (and feature-name warning) of scaler.transform.
+        n = len(FEATURES)
+        mean = scaler.mean_ if getattr(scaler, "with_mean", True) else np.zeros(n)
+        scale = scaler.scale_ if getattr(scaler, "with_std", True) else np.ones(n)
+        mean = np.asarray(mean, dtype=np.float64)
+        scale = np.asarray(scale, dtype=np.float64)
+        leaves = {
+            node: {
+                "diagnosis": DIAGNOSIS_MAP.get(leaf["label"], "Unknown"),
+                "confidence": leaf["confidence"],
+                "explanation": leaf["explanation"]
+            }
+            for node, leaf in build_leaf_table(model, mean, scale).items()
+        }
+        self._state = LoadedModel(
+            model=model,
+            scaler=scaler,
+            mean=mean,
+            scale=scale,
+            version=version,
+            loaded_at=time.time(),
+            leaves=leaves
+        )
+
+    def predict(self, values: Sequence[float]) -> Dict[str, Any]:
+        """Predict from values in FEATURES order"""
+        return self.predict_batch([values])[0]
+
+    def predict_batch(self, rows: Sequence[Sequence[float]]) -> List[Dict[str, Any]]:
+        """Predict many panels at once; each result carries its leaf's explanation.
+
+        The diagnosis, confidence and explanation of every leaf are
+        precomputed, so per row this is one tree descent (model.apply) and
+        a dict lookup. The returned dicts are shared; do not modify them.
+        """
+        if len(rows) == 0:
+            return []
+        state = self._state
+        if state is None:
+            return [self._rule_based(values) for values in rows]
+        try:
+            features = (np.asarray(rows, dtype=np.float64) - state.mean) / state.scale
+            leaves = state.model.apply(features)
+            return [state.leaves[int(leaf)] for leaf in leaves]
+        except Exception as e:
+            print(f"Error during prediction: {e}")
+            return [{"diagnosis": "Error in prediction", "confidence": 0.0, "explanation": None}
+                    for _ in rows]
+
+    def _rule_based(self, values: Sequence[float]) -> Dict[str, Any]:
+        """Fallback when the model file is missing"""
+        cbc = dict(zip(FEATURES, values))
+        if cbc["HGB"] < 13.5:
+            return _rule("Anemia Detected", 0.92, "HGB < 13.5 g/dL")
+        if cbc["WBC"] > 11.0:
+            return _rule("Elevated WBC - Further Investigation Needed", 0.88, "WBC > 11 x10^3/µL")
+        if cbc["PLT"] < 150:
+            return _rule("Low Platelet Count", 0.90, "PLT < 150 x10^3/µL")
+        return _rule("Normal", 0.85, "HGB, WBC and PLT within reference limits")
+
+    def warm_up(self):
+        """Run one dummy prediction so the first real request pays no first-call costs"""
+        self.predict(WARMUP_SAMPLE)
+        self.ready = True
+
+
+def _rule(diagnosis: str, confidence: float, text: str) -> Dict[str, Any]:
+    return {
+        "diagnosis": diagnosis,
+        "confidence": confidence,
+        "explanation": {"leaf": None, "samples": None, "conditions": [], "text": f"Rule-based fallback: {text}"}
+    }
+
+
+engine = PredictionEngine()
+
+# Optional medical LLM for the AI chat, loaded with load_llm()
+llm_tokenizer = None
+llm_model = None
+
+
+def load_llm(model_name: str = LLM_NAME):
+    """Load the chat LLM into this process (the launcher does this before forking)"""
+    global llm_tokenizer, llm_model
+    from transformers import AutoTokenizer, AutoModelForCausalLM
+    import torch
+
+    llm_tokenizer = AutoTokenizer.from_pretrained(model_name)
+    llm_model = AutoModelForCausalLM.from_pretrained(
+        model_name,
+        device_map="auto",
+        torch_dtype=torch.float16
+    )
+    llm_model.eval()
+    print(f"✓ LLM {model_name} loaded successfully")
+    return llm_tokenizer, llm_model
@@ -0,0 +1,105 @@
+from datetime import date, datetime
+from typing import Optional, List, Any, Sequence, Union
+
+import pydantic_core
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel, TypeAdapter
+
+from database.database import PATIENT_COLUMNS, REPORT_COLUMNS
+
+
+# Typed API responses. List endpoints fetch plain tuples, validate them into
+# these models in one pydantic-core call (which also turns MySQL Decimals
+# into floats) and hand the models to FastJSONResponse, which encodes them
+# in Rust. Returning a response object skips FastAPI's own validate and
+# serialize pass; response_model on the route still documents the shape.
+
+
+class FastJSONResponse(JSONResponse):
+    """JSON response encoded by pydantic-core (models, dicts, dates and Decimals alike)"""
+
+    def render(self, content: Any) -> bytes:
+        return pydantic_core.to_json(content)
+
+
+# ============ RESPONSE MODELS ============
+
+class PatientOut(BaseModel):
+    # Only the keys are guaranteed; any other column may be NULL in older
+    # rows, and one bad row must not turn a whole list into a 500.
+    patient_id: int
+    name: Optional[str] = None
+    age: Optional[int] = None
+    phone: Optional[str] = None
+    total_payment: Optional[float] = None
+    remaining: Optional[float] = None
+    secertary_id: Optional[int] = None
+    now_date: Optional[Union[datetime, date]] = None
+    last_visit_at: Optional[datetime] = None
+    secretary_name: Optional[str] = None
+    paid_amount: Optional[float] = None
+
+
+class ReportOut(BaseModel):
+    report_id: int
+    patient_id: int
+    WBC: Optional[float] = None
+    RBC: Optional[float] = None
+    HGB: Optional[float] = None
+    HCT: Optional[float] = None
+    MCV: Optional[float] = None
+    MCH: Optional[float] = None
+    MCHC: Optional[float] = None
+    PLT: Optional[float] = None
+    Diagnosis: Optional[str] = None
+    created_at: Optional[datetime] = None
+    patient_name: Optional[str] = None
+    age: Optional[int] = None
+    phone: Optional[str] = None
+    now_date: Optional[Union[datetime, date]] = None
+
+
+class DashboardStats(BaseModel):
+    total_patients: int
+    total_reports: int
+    pending_reports: int
+
+
+class Condition(BaseModel):
+    feature: str
+    min: Optional[float] = None
+    max: Optional[float] = None
+    unit: str
+
+
+class Explanation(BaseModel):
+    leaf: Optional[int] = None
+    samples: Optional[int] = None
+    conditions: List[Condition]
+    text: str
+
+
+class PredictionOut(BaseModel):
+    diagnosis: str
+    confidence: float
+    explanation: Optional[Explanation] = None
+
+
+# ============ ROW MAPPING ============
+
+PATIENT_LIST = TypeAdapter(List[PatientOut])
+REPORT_LIST = TypeAdapter(List[ReportOut])
+
+
+def _from_rows(adapter: TypeAdapter, columns: Sequence[str], rows: Sequence[tuple]) -> list:
+    return adapter.validate_python([dict(zip(columns, row)) for row in rows])
+
+
+def patients_from_rows(rows: Sequence[tuple]) -> List[PatientOut]:
+    """Tuple-cursor rows in PATIENT_COLUMNS order -> models"""
+    return _from_rows(PATIENT_LIST, PATIENT_COLUMNS, rows)
+
+
+def reports_from_rows(rows: Sequence[tuple]) -> List[ReportOut]:
+    """Tuple-cursor rows in REPORT_COLUMNS order -> models"""
+    return _from_rows(REPORT_LIST, REPORT_COLUMNS, rows)
@@ -0,0 +1,154 @@
+"""Production entry point: N uvicorn workers forked from one preloaded parent.
+
+The parent imports main (which loads DecisionTree.pkl and scaler.pkl, and
+the LLM with --preload-llm), applies the schema migrations once, freezes the
+GC so refcount updates do not touch those objects' pages, binds the
+listening socket and forks the workers. The model memory is therefore
+shared copy-on-write instead of being loaded once per worker as
+`uvicorn --workers N` does.
+
+    python serve.py --workers 4 --port 7500
+    python serve.py --workers 4 --health-port-base 7600   # worker i health on 7600+i
+
+Each worker warms up with a dummy prediction during startup and serves
+/health and /ready; with --health-port-base every worker also listens on its
+own port so a specific worker can be probed. Fork is POSIX-only: on Windows
+this falls back to a single in-process worker.
+
+Logins must be visible to every worker, so with more than one worker the
+sessions go to a SQLite file (--session-db) unless HEMASENSE_SESSION_STORE
+already names a shared store; the per-process memory store is refused.
+"""
+import argparse
+import gc
+import os
+import signal
+import socket
+import sys
+import time
+
+import uvicorn
+
+
+def bind_socket(host: str, port: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def configure_sessions(args):
+    """Point the session store at a file all workers share (before main is imported)"""
+    if args.workers == 1 or not hasattr(os, "fork"):
+        return
+    url = os.environ.get("HEMASENSE_SESSION_STORE")
+    if url is None:
+        os.environ["HEMASENSE_SESSION_STORE"] = f"sqlite:///{os.path.abspath(args.session_db)}"
+        print(f"✓ Sessions shared through {args.session_db}")
+    elif not url.startswith("sqlite:///"):
+        raise SystemExit(f"HEMASENSE_SESSION_STORE={url} is per process and cannot serve "
+                         f"{args.workers} workers; use sqlite:///path or --workers 1")
+
+
+def run_worker(index: int, app, sockets, args):
+    """Body of one worker process"""
+    os.environ["HEMASENSE_WORKER_ID"] = str(index)
+    config = uvicorn.Config(app, log_level=args.log_level, timeout_keep_alive=args.keep_alive,
+                            proxy_headers=True, lifespan="on")
+    server = uvicorn.Server(config)
+    server.run(sockets=sockets)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HemaSense production server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=7500)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--health-port-base", type=int, default=None,
+                        help="give worker i a private listener on this port + i")
+    parser.add_argument("--preload-llm", action="store_true", help="also load the chat LLM before forking")
+    parser.add_argument("--log-level", default="info")
+    parser.add_argument("--keep-alive", type=int, default=5)
+    parser.add_argument("--session-db", default="sessions.db",
+                        help="SQLite session file shared by the workers (when HEMASENSE_SESSION_STORE is unset)")
+    args = parser.parse_args()
+
+    # ---- load everything once, in the parent ----
+    configure_sessions(args)
+    import main as application
+    # Schema changes run here, once; the workers' lifespans then only build
+    # their search index and warm up.
+    application.migrate_schema()
+    if args.preload_llm:
+        import prediction
+        prediction.load_llm()
+
+    shared = bind_socket(args.host, args.port)
+    health = [bind_socket(args.host, args.health_port_base + i) if args.health_port_base else None
+              for i in range(args.workers)]
+
+    if args.workers == 1 or not hasattr(os, "fork"):
+        run_worker(0, application.app, [shared] + [s for s in health[:1] if s], args)
+        return
+
+    # Move everything allocated so far (models included) to the permanent
+    # generation so the collector never writes to those pages in the children.
+    gc.collect()
+    gc.freeze()
+
+    children = {}
+    stopping = False
+
+    def spawn(index: int):
+        pid = os.fork()
+        if pid == 0:
+            for i, sock in enumerate(health):
+                if sock is not None and i != index:
+                    sock.close()
+            try:
+                own = [health[index]] if health[index] is not None else []
+                run_worker(index, application.app, [shared] + own, args)
+            finally:
+                os._exit(0)
+        children[pid] = index
+        print(f"✓ Worker {index} started (pid {pid})")
+
+    def shutdown(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+
+    for index in range(args.workers):
+        spawn(index)
+
+    # Supervise: restart workers that die unexpectedly
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        index = children.pop(pid, None)
+        if index is None:
+            continue
+        if not stopping:
+            print(f"⚠ Worker {index} (pid {pid}) exited with status {status}, restarting")
+            time.sleep(1)
+            spawn(index)
+
+    shared.close()
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
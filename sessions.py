@@ -0,0 +1,286 @@
+import json
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from collections import deque
+from typing import Optional, Dict, Any, Deque
+
+from starlette.datastructures import MutableHeaders
+from starlette.requests import HTTPConnection
+
+
+# Server-side sessions. The cookie only carries an opaque random id; the
+# session dict lives in a SessionStore and is resolved once per request by
+# ServerSessionMiddleware, which exposes it as request.session exactly like
+# Starlette's cookie-based SessionMiddleware did.
+
+SESSION_COOKIE = "hs_sid"
+SESSION_TTL = 12 * 60 * 60      # idle timeout in seconds
+SWEEP_INTERVAL = 60.0           # how often expired sessions are evicted
+
+
+def new_session_id() -> str:
+    """128-bit random id, 22 URL-safe characters"""
+    return secrets.token_urlsafe(16)
+
+
+# ============ STORES ============
+
+class MemorySessionStore:
+    """Per-process store with sliding TTL eviction"""
+
+    def __init__(self, ttl: float = SESSION_TTL):
+        self.ttl = ttl
+        self._sessions: Dict[str, list] = {}    # sid -> [expires, data]
+        self._lock = threading.Lock()
+        self._next_sweep = time.monotonic() + SWEEP_INTERVAL
+
+    def create(self, data: Dict[str, Any]) -> str:
+        sid = new_session_id()
+        with self._lock:
+            self._sweep()
+            self._sessions[sid] = [time.monotonic() + self.ttl, dict(data)]
+        return sid
+
+    def get(self, sid: str) -> Optional[Dict[str, Any]]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._sessions.get(sid)
+            if entry is None:
+                return None
+            if entry[0] < now:
+                del self._sessions[sid]
+                return None
+            entry[0] = now + self.ttl
+            return entry[1]
+
+    def save(self, sid: str, data: Dict[str, Any]):
+        with self._lock:
+            self._sessions[sid] = [time.monotonic() + self.ttl, dict(data)]
+
+    def revoke(self, sid: str) -> bool:
+        with self._lock:
+            return self._sessions.pop(sid, None) is not None
+
+    def revoke_user(self, role: str, user_id: int) -> int:
+        """Drop every session of one user; returns how many were removed"""
+        with self._lock:
+            doomed = [sid for sid, (_, data) in self._sessions.items()
+                      if _owner(data) == (role, user_id)]
+            for sid in doomed:
+                del self._sessions[sid]
+        return len(doomed)
+
+    def active_count(self) -> int:
+        with self._lock:
+            self._sweep(force=True)
+            return len(self._sessions)
+
+    def _sweep(self, force: bool = False):
+        now = time.monotonic()
+        if not force and now < self._next_sweep:
+            return
+        self._next_sweep = now + SWEEP_INTERVAL
+        expired = [sid for sid, (expires, _) in self._sessions.items() if expires < now]
+        for sid in expired:
+            del self._sessions[sid]
+
+
+class SQLiteSessionStore:
+    """Store in a local SQLite file, shared by all workers on the same host.
+
+    Connections are opened lazily, one per thread and process. The store is
+    usually created in serve.py's parent before it forks, and a SQLite
+    handle must never be carried across a fork.
+    """
+
+    def __init__(self, path: str, ttl: float = SESSION_TTL):
+        self.path = path
+        self.ttl = ttl
+        self._local = threading.local()
+        self._next_sweep = 0.0
+        conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+        try:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS sessions (
+                    sid TEXT PRIMARY KEY,
+                    data TEXT NOT NULL,
+                    role TEXT,
+                    user_id INTEGER,
+                    expires REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_sessions_expires ON sessions (expires)")
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_sessions_user ON sessions (role, user_id)")
+        finally:
+            conn.close()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            # First use in this thread, or a handle inherited through fork:
+            # leave the inherited one alone and open our own.
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def create(self, data: Dict[str, Any]) -> str:
+        sid = new_session_id()
+        self.save(sid, data)
+        self._sweep()
+        return sid
+
+    def get(self, sid: str) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        row = self._conn().execute(
+            "SELECT data, expires FROM sessions WHERE sid = ?", (sid,)
+        ).fetchone()
+        if row is None or row[1] < now:
+            return None
+        # Only write the sliding expiry back once half the TTL is used up,
+        # so plain reads stay reads.
+        if row[1] - now < self.ttl / 2:
+            self._conn().execute("UPDATE sessions SET expires = ? WHERE sid = ?", (now + self.ttl, sid))
+        return json.loads(row[0])
+
+    def save(self, sid: str, data: Dict[str, Any]):
+        role, user_id = _owner(data) or (None, None)
+        self._conn().execute(
+            "INSERT OR REPLACE INTO sessions (sid, data, role, user_id, expires) VALUES (?, ?, ?, ?, ?)",
+            (sid, json.dumps(data, separators=(",", ":")), role, user_id, time.time() + self.ttl)
+        )
+
+    def revoke(self, sid: str) -> bool:
+        return self._conn().execute("DELETE FROM sessions WHERE sid = ?", (sid,)).rowcount > 0
+
+    def revoke_user(self, role: str, user_id: int) -> int:
+        return self._conn().execute(
+            "DELETE FROM sessions WHERE role = ? AND user_id = ?", (role, user_id)
+        ).rowcount
+
+    def active_count(self) -> int:
+        return self._conn().execute(
+            "SELECT COUNT(*) FROM sessions WHERE expires >= ?", (time.time(),)
+        ).fetchone()[0]
+
+    def _sweep(self):
+        now = time.time()
+        if now < self._next_sweep:
+            return
+        self._next_sweep = now + SWEEP_INTERVAL
+        self._conn().execute("DELETE FROM sessions WHERE expires < ?", (now,))
+
+
+def _owner(data: Dict[str, Any]):
+    user = data.get("user")
+    if not user:
+        return None
+    return user.get("role"), user.get("user_id")
+
+
+def store_from_env():
+    """HEMASENSE_SESSION_STORE=memory (default, one worker only) or sqlite:///path/to/sessions.db"""
+    url = os.environ.get("HEMASENSE_SESSION_STORE", "memory")
+    if url.startswith("sqlite:///"):
+        return SQLiteSessionStore(url[len("sqlite:///"):])
+    return MemorySessionStore()
+
+
+# ============ METRICS ============
+
+class SessionMetrics:
+    """Lookup latency over the most recent requests"""
+
+    def __init__(self, window: int = 2048):
+        self._samples: Deque[float] = deque(maxlen=window)
+        self.lookups = 0
+        self.misses = 0
+
+    def record(self, seconds: float, hit: bool):
+        self._samples.append(seconds)
+        self.lookups += 1
+        if not hit:
+            self.misses += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        samples = sorted(self._samples)
+
+        def pct(p):
+            if not samples:
+                return 0.0
+            return round(samples[min(len(samples) - 1, int(p * len(samples)))] * 1e6, 1)
+
+        return {
+            "lookups": self.lookups,
+            "misses": self.misses,
+            "lookup_us_p50": pct(0.50),
+            "lookup_us_p95": pct(0.95),
+            "lookup_us_max": round(samples[-1] * 1e6, 1) if samples else 0.0
+        }
+
+
+# ============ MIDDLEWARE ============
+
+class ServerSessionMiddleware:
+    """ASGI middleware that maps an opaque cookie id to a server-side session"""
+
+    def __init__(self, app, store, cookie_name: str = SESSION_COOKIE,
+                 max_age: int = SESSION_TTL, https_only: bool = False,
+                 metrics: Optional[SessionMetrics] = None):
+        self.app = app
+        self.store = store
+        self.cookie_name = cookie_name
+        self.max_age = max_age
+        self.security_flags = "httponly; samesite=lax" + ("; secure" if https_only else "")
+        self.metrics = metrics or session_metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+
+        sid = HTTPConnection(scope).cookies.get(self.cookie_name)
+        data = None
+        if sid:
+            start = time.perf_counter()
+            data = self.store.get(sid)
+            self.metrics.record(time.perf_counter() - start, data is not None)
+
+        scope["session"] = dict(data) if data else {}
+        scope["session_id"] = sid if data else None
+        initial = dict(scope["session"])
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                session = scope["session"]
+                if session != initial:
+                    headers = MutableHeaders(scope=message)
+                    current = scope["session_id"]
+                    if session:
+                        if current and _owner(session) == _owner(initial):
+                            self.store.save(current, session)
+                        else:
+                            # New identity (login): issue a fresh id so an id
+                            # seen before login can never be reused after it.
+                            if current:
+                                self.store.revoke(current)
+                            current = self.store.create(session)
+                            headers.append("Set-Cookie", self._cookie(current, self.max_age))
+                    elif current:
+                        self.store.revoke(current)
+                        headers.append("Set-Cookie", self._cookie("", 0))
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+    def _cookie(self, value: str, max_age: int) -> str:
+        return f"{self.cookie_name}={value}; path=/; Max-Age={max_age}; {self.security_flags}"
+
+
+session_store = store_from_env()
+session_metrics = SessionMetrics()
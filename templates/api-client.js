@@ -3,6 +3,11 @@
 
 const API_BASE_URL = 'http://127.0.0.1:7500';
 
+// GETs refused by the server's admission control (429/503) are retried
+// after Retry-After seconds, a few times, before the page sees an error
+const BUSY_RETRIES = 3;
+const MAX_BUSY_WAIT_SECONDS = 10;
+
 /**
  * API Client with common fetch wrapper
  */
@@ -22,9 +27,20 @@ class ApiClient {
         };
 
         const config = { ...defaultOptions, ...options };
+        const method = (config.method || 'GET').toUpperCase();
 
         try {
-            const response = await fetch(url, config);
+            let response = await fetch(url, config);
+
+            // Server busy: wait as long as it asks, then try again (GETs only,
+            // so nothing is ever submitted twice)
+            for (let attempt = 0; method === 'GET' && attempt < BUSY_RETRIES
+                    && (response.status === 429 || response.status === 503); attempt++) {
+                const retryAfter = parseInt(response.headers.get('Retry-After'), 10);
+                const seconds = Math.min(Number.isNaN(retryAfter) ? 1 : retryAfter, MAX_BUSY_WAIT_SECONDS);
+                await new Promise(resolve => setTimeout(resolve, seconds * 1000 * (0.8 + Math.random() * 0.4)));
+                response = await fetch(url, config);
+            }
 
             // Handle 401 Unauthorized - redirect to login
             if (response.status === 401) {
@@ -54,8 +70,11 @@ class ApiClient {
     /**
      * GET request
      */
-    static async get(endpoint) {
-        return this.request(endpoint, { method: 'GET' });
+    static async get(endpoint, { fresh = false } = {}) {
+        // fresh: read from the primary database, for refetches prompted by
+        // a live-update event that a lagging replica may not have seen yet
+        const headers = fresh ? { 'X-Read-Primary': '1' } : {};
+        return this.request(endpoint, { method: 'GET', headers });
     }
 
     /**
@@ -123,6 +142,13 @@ const PatientAPI = {
         return ApiClient.get('/api/patients');
     },
 
+    /**
+     * Search patients by name or phone (best matches first)
+     */
+    async search(query, limit = 20) {
+        return ApiClient.get(`/api/patients/search?q=${encodeURIComponent(query)}&limit=${limit}`);
+    },
+
     /**
      * Get single patient by ID
      */
@@ -151,6 +177,20 @@ const PatientAPI = {
         return ApiClient.delete(`/api/patients/${patientId}`);
     },
 
+    /**
+     * Register a new visit for a returning patient
+     */
+    async startVisit(patientId, totalPayment = 0) {
+        return ApiClient.post(`/api/patients/${patientId}/visits`, { total_payment: totalPayment });
+    },
+
+    /**
+     * Get all reports of a patient as CBC time series
+     */
+    async getHistory(patientId) {
+        return ApiClient.get(`/api/patients/${patientId}/history`);
+    },
+
     /**
      * Add payment to patient
      */
@@ -166,8 +206,8 @@ const ReportAPI = {
     /**
      * Get pending reports (patients without reports)
      */
-    async getPending() {
-        return ApiClient.get('/api/reports/pending');
+    async getPending(fresh = false) {
+        return ApiClient.get('/api/reports/pending', { fresh });
     },
 
     /**
@@ -199,8 +239,8 @@ const DashboardAPI = {
     /**
      * Get dashboard statistics
      */
-    async getStats() {
-        return ApiClient.get('/api/dashboard/stats');
+    async getStats(fresh = false) {
+        return ApiClient.get('/api/dashboard/stats', { fresh });
     },
 };
 
@@ -249,6 +289,34 @@ const AIAPI = {
     },
 };
 
+/**
+ * Live updates (Server-Sent Events)
+ */
+const LiveAPI = {
+    /**
+     * Subscribe to change events pushed by the server.
+     * handlers maps event types (e.g. 'patient.created') to callbacks;
+     * handlers.resync is called when the page must reload its data.
+     * The browser reconnects on its own and resumes from the last event id.
+     */
+    subscribe(topics, handlers) {
+        const url = `${API_BASE_URL}/api/events?topics=${topics.join(',')}`;
+        const source = new EventSource(url, { withCredentials: true });
+
+        Object.keys(handlers).forEach(type => {
+            source.addEventListener(type, event => {
+                try {
+                    handlers[type](JSON.parse(event.data || '{}'));
+                } catch (error) {
+                    console.error(`Live update error (${type}):`, error);
+                }
+            });
+        });
+
+        return source;
+    },
+};
+
 /**
  * Utility functions
  */
@@ -165,6 +165,8 @@ function setupPredictButton() {
                 document.getElementById('diagnosisLabel').textContent = diagnosis;
                 document.getElementById('confidenceText').textContent = `Confidence: ${confidence}%`;
                 document.getElementById('confidenceFill').style.width = `${confidence}%`;
+                document.getElementById('predictionExplanation').textContent =
+                    prediction.explanation ? `Why: ${prediction.explanation.text}` : '';
 
                 // Update diagnosis class
                 const label = document.getElementById('diagnosisLabel');
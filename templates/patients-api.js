@@ -82,22 +82,33 @@ function setupSearch() {
     const closeIcon = document.querySelector('.close-icon');
 
     if (searchInput) {
+        let searchTimer = null;
+        let searchSeq = 0;
         searchInput.addEventListener('input', function () {
-            const searchTerm = this.value.toLowerCase();
+            const searchTerm = this.value.trim();
+            clearTimeout(searchTimer);
             if (searchTerm === '') {
+                searchSeq++;
                 displayPatients(allPatients);
-            } else {
-                const filtered = allPatients.filter(p =>
-                    p.name.toLowerCase().includes(searchTerm) ||
-                    p.phone.includes(searchTerm)
-                );
-                displayPatients(filtered);
+                return;
             }
+            // Debounced server-side search; responses to older keystrokes are dropped
+            searchTimer = setTimeout(async () => {
+                const seq = ++searchSeq;
+                try {
+                    const results = await PatientAPI.search(searchTerm, 50);
+                    if (seq === searchSeq) displayPatients(results);
+                } catch (error) {
+                    console.error('Patient search error:', error);
+                }
+            }, 120);
         });
 
         if (closeIcon) {
             closeIcon.addEventListener('click', function () {
                 searchInput.value = '';
+                clearTimeout(searchTimer);
+                searchSeq++;
                 displayPatients(allPatients);
             });
         }
@@ -0,0 +1,227 @@
+"""Retrain the Decision Tree and scaler from labelled CBC data.
+
+Reads labelled panels from the report table (streamed in batches) or from
+the notebook CSV, runs a cross-validated hyperparameter search over all
+cores, and writes a versioned, checksummed artifact set:
+
+    models/<version>/DecisionTree.pkl
+    models/<version>/scaler.pkl
+    models/<version>/manifest.json     sha256 of each artifact, metrics, params
+
+With --promote the version becomes models/CURRENT (an atomic rename), and
+running workers switch to it on their next periodic check.
+
+    python train.py --source csv
+    python train.py --source db --promote
+    python train.py --source both --cv 10 --n-jobs -1 --promote
+"""
+import argparse
+import hashlib
+import json
+import os
+import pickle
+import platform
+import time
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+import joblib
+import numpy as np
+import pandas as pd
+import sklearn
+from sklearn.metrics import accuracy_score, f1_score, confusion_matrix, classification_report
+from sklearn.model_selection import GridSearchCV, StratifiedKFold, train_test_split
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import StandardScaler
+from sklearn.tree import DecisionTreeClassifier
+
+from prediction import (FEATURES, DIAGNOSIS_MAP, REGISTRY_DIR, sha256_file,
+                        set_current_version)
+
+CSV_PATH = os.path.join("AI Models NoteBook", "diagnosed_cbc_data_v4.csv")
+LABELS = {name.casefold(): label for label, name in DIAGNOSIS_MAP.items()}
+
+PARAM_GRID = {
+    "tree__criterion": ["gini", "entropy"],
+    "tree__max_depth": [3, 4, 5, 6, 8, 10, None],
+    "tree__min_samples_split": [2, 5, 10],
+    "tree__min_samples_leaf": [1, 2, 4, 8],
+    "tree__class_weight": [None, "balanced"],
+}
+
+
+# ============ DATA ============
+
+def _encode(frame: pd.DataFrame) -> pd.DataFrame:
+    """Map diagnosis names to class ids, dropping rows that are not one of the 9 classes"""
+    labels = frame["Diagnosis"].astype(str).str.strip().str.casefold().map(LABELS)
+    frame = frame.assign(label=labels).dropna(subset=FEATURES + ["label"])
+    return frame.astype({"label": int})
+
+
+def load_csv(path: str = CSV_PATH, chunksize: int = 10_000) -> pd.DataFrame:
+    chunks = pd.read_csv(path, usecols=FEATURES + ["Diagnosis"], chunksize=chunksize)
+    return pd.concat([_encode(chunk) for chunk in chunks], ignore_index=True)
+
+
+def load_reports(batch_size: int = 5_000) -> pd.DataFrame:
+    """Doctor-confirmed reports from the report table"""
+    from database.database import iter_labelled_reports
+    chunks = [_encode(pd.DataFrame(rows, columns=FEATURES + ["Diagnosis"]).astype({f: float for f in FEATURES}))
+              for rows in iter_labelled_reports(batch_size)]
+    if not chunks:
+        return pd.DataFrame(columns=FEATURES + ["Diagnosis", "label"])
+    return pd.concat(chunks, ignore_index=True)
+
+
+def load_data(source: str) -> pd.DataFrame:
+    frames = []
+    if source in ("csv", "both"):
+        frames.append(load_csv())
+    if source in ("db", "both"):
+        frames.append(load_reports())
+    return pd.concat(frames, ignore_index=True)
+
+
+# ============ TRAINING ============
+
+def drop_rare_classes(data: pd.DataFrame, minimum: int = 2) -> Tuple[pd.DataFrame, Dict[str, int]]:
+    """Remove classes with fewer than `minimum` panels (a stratified split needs two per class)"""
+    counts = data["label"].value_counts()
+    rare = counts[counts < minimum]
+    dropped = {DIAGNOSIS_MAP[int(label)]: int(n) for label, n in rare.items()}
+    return data[~data["label"].isin(rare.index)], dropped
+
+
+def split(X, y, test_size: float, seed: int):
+    try:
+        return train_test_split(X, y, test_size=test_size, random_state=seed, stratify=y)
+    except ValueError as e:
+        # Too few panels for every class to reach the test set
+        print(f"⚠ Stratified split not possible ({e}); using a random split")
+        return train_test_split(X, y, test_size=test_size, random_state=seed)
+
+
+def train(data: pd.DataFrame, cv: int, n_jobs: int, seed: int, test_size: float) -> Tuple[Pipeline, dict]:
+    X, y = data[FEATURES], data["label"].to_numpy()
+    X_train, X_test, y_train, y_test = split(X, y, test_size, seed)
+
+    # The scaler sits inside the pipeline so each CV fold is scaled on its
+    # own training part only.
+    pipeline = Pipeline([("scaler", StandardScaler()), ("tree", DecisionTreeClassifier(random_state=seed))])
+    # Stratified CV needs every class in every fold
+    smallest_class = int(np.unique(y_train, return_counts=True)[1].min())
+    folds = max(2, min(cv, smallest_class))
+    search = GridSearchCV(
+        pipeline,
+        PARAM_GRID,
+        cv=StratifiedKFold(n_splits=folds, shuffle=True, random_state=seed),
+        scoring="f1_macro",
+        n_jobs=n_jobs,
+        refit=True,
+    )
+    start = time.perf_counter()
+    search.fit(X_train, y_train)
+    search_seconds = time.perf_counter() - start
+
+    predicted = search.best_estimator_.predict(X_test)
+    metrics = {
+        "cv_folds": folds,
+        "cv_f1_macro": round(float(search.best_score_), 4),
+        "test_accuracy": round(float(accuracy_score(y_test, predicted)), 4),
+        "test_f1_macro": round(float(f1_score(y_test, predicted, average="macro")), 4),
+        "confusion_matrix": confusion_matrix(y_test, predicted, labels=sorted(DIAGNOSIS_MAP)).tolist(),
+        "per_class": classification_report(
+            y_test, predicted, labels=sorted(DIAGNOSIS_MAP),
+            target_names=[DIAGNOSIS_MAP[i] for i in sorted(DIAGNOSIS_MAP)],
+            output_dict=True, zero_division=0
+        ),
+        "candidates": len(search.cv_results_["params"]),
+        "search_seconds": round(search_seconds, 2),
+        "n_train": int(len(y_train)),
+        "n_test": int(len(y_test)),
+    }
+    return search.best_estimator_, {"params": search.best_params_, "metrics": metrics}
+
+
+# ============ ARTIFACTS ============
+
+def write_artifacts(pipeline: Pipeline, result: dict, data: pd.DataFrame, source: str,
+                    registry: str = REGISTRY_DIR, dropped: Optional[Dict[str, int]] = None) -> str:
+    """Write a new version directory; returns the version name"""
+    data_hash = sha256_of_frame(data)
+    version = f"{datetime.now():%Y%m%d-%H%M%S}-{data_hash[:8]}"
+    staging = os.path.join(registry, f".{version}.tmp")
+    os.makedirs(staging)
+
+    with open(os.path.join(staging, "DecisionTree.pkl"), "wb") as file:
+        pickle.dump(pipeline.named_steps["tree"], file)
+    joblib.dump(pipeline.named_steps["scaler"], os.path.join(staging, "scaler.pkl"))
+
+    manifest = {
+        "version": version,
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "source": source,
+        "data": {"rows": int(len(data)), "sha256": data_hash,
+                 "class_counts": {DIAGNOSIS_MAP[int(k)]: int(v) for k, v in data["label"].value_counts().items()},
+                 "dropped_classes": dropped or {}},
+        "features": FEATURES,
+        "params": {k.replace("tree__", ""): v for k, v in result["params"].items()},
+        "metrics": result["metrics"],
+        "environment": {"python": platform.python_version(), "sklearn": sklearn.__version__},
+        "artifacts": {name: {"sha256": sha256_file(os.path.join(staging, name)),
+                             "bytes": os.path.getsize(os.path.join(staging, name))}
+                      for name in ("DecisionTree.pkl", "scaler.pkl")},
+    }
+    with open(os.path.join(staging, "manifest.json"), "w") as file:
+        json.dump(manifest, file, indent=2)
+
+    # The version directory appears complete or not at all
+    os.replace(staging, os.path.join(registry, version))
+    return version
+
+
+def sha256_of_frame(data: pd.DataFrame) -> str:
+    values = np.ascontiguousarray(data[FEATURES].to_numpy(dtype=np.float64))
+    digest = hashlib.sha256(values.tobytes())
+    digest.update(np.ascontiguousarray(data["label"].to_numpy(dtype=np.int64)).tobytes())
+    return digest.hexdigest()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--source", choices=["csv", "db", "both"], default="csv")
+    parser.add_argument("--cv", type=int, default=5, help="cross-validation folds")
+    parser.add_argument("--n-jobs", type=int, default=-1, help="parallel workers (-1 = all cores)")
+    parser.add_argument("--test-size", type=float, default=0.2)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--registry", default=REGISTRY_DIR)
+    parser.add_argument("--promote", action="store_true", help="make this version the served one")
+    args = parser.parse_args()
+
+    data, dropped = drop_rare_classes(load_data(args.source))
+    for name, count in dropped.items():
+        print(f"⚠ Dropping {name}: only {count} labelled panel(s)")
+    if data.empty:
+        raise SystemExit("No labelled data found")
+    if data["label"].nunique() < 2:
+        raise SystemExit("Need labelled panels from at least two diagnoses")
+    print(f"Training on {len(data)} labelled panels from {args.source}")
+
+    pipeline, result = train(data, args.cv, args.n_jobs, args.seed, args.test_size)
+    metrics = result["metrics"]
+    print(f"Best params: {result['params']}")
+    print(f"CV f1_macro {metrics['cv_f1_macro']}, test accuracy {metrics['test_accuracy']}, "
+          f"test f1_macro {metrics['test_f1_macro']} "
+          f"({metrics['candidates']} candidates in {metrics['search_seconds']}s)")
+
+    os.makedirs(args.registry, exist_ok=True)
+    version = write_artifacts(pipeline, result, data, args.source, args.registry, dropped)
+    print(f"✓ Artifacts written to {os.path.join(args.registry, version)}")
+    if args.promote:
+        set_current_version(version, args.registry)
+        print(f"✓ {version} promoted to {os.path.join(args.registry, 'CURRENT')}")
+
+
+if __name__ == "__main__":
+    main()